@@ -1,24 +1,34 @@
 import os
 import uuid
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Query
-from fastapi.responses import FileResponse, JSONResponse
+import json
+import asyncio
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Query, BackgroundTasks
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import ValidationError
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, timezone
 from bson import ObjectId
 import os
-import csv
-import io
 
-from .db import SessionLocal, init_db
+from .db import init_db, run_db
 from .models import Backtest
+from . import repository
+from .repository import update_backtest, backtest_status, fail_interrupted
 from .schemas import BacktestParams, BacktestCreateResponse
 from .mongo_models import HistoricalData, PyObjectId, FileMetadata
-from .utils import validate_csv, normalize_ohlc_headers
-from .strategy_adapter import run_backtest_to_outputs
+from .utils import CsvIngest, save_upload
+from .strategy_adapter import (
+    run_backtest_to_outputs, strategy_name, columns_to_records, records_to_columns, downsample_curve, render_chart,
+    format_times, CANDLE_TIMEFRAMES,
+)
+from .chart_cache import chart_key, load_chart, store_chart
 from .mongo_utils import mongodb
+from .jobs import jobs, QueueFull, STRATEGY_WORKERS
+from .progress import ProgressFile
+from .results_cache import result_key, lookup_result, load_trades, store_result
+from .trade_store import TRADE_SORTS, save_trades, copy_trades, has_trades, query_trades, trades_between
 
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 BACKEND_DIR = os.path.dirname(os.path.dirname(APP_DIR))  # backend/
@@ -30,9 +40,15 @@ DATA_BASE = os.getenv("DATA_DIR", ROOT_DIR)
 DATA_DIR = os.path.join(DATA_BASE, "data")
 DOWNLOAD_DIR = os.path.join(DATA_DIR, "downloads")
 UPLOAD_DIR = os.path.join(DATA_DIR, "uploads")
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+PROGRESS_DIR = os.path.join(DATA_DIR, "progress")
+CHART_DIR = os.path.join(DATA_DIR, "charts")
+
+# Default cap on equity curve points returned by GET /backtests/{id}
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", 2000))
 
 # Create necessary directories
-for directory in [DATA_DIR, DOWNLOAD_DIR, UPLOAD_DIR]:
+for directory in [DATA_DIR, DOWNLOAD_DIR, UPLOAD_DIR, CACHE_DIR, PROGRESS_DIR, CHART_DIR]:
     os.makedirs(directory, exist_ok=True)
 
 app = FastAPI(title="Backtesting API")
@@ -69,11 +85,20 @@ app.add_middleware(
 
 # Initialize SQLite database
 init_db()
+# Jobs run inside this process: those a previous run left queued or running
+# will never finish
+fail_interrupted()
+
+
+@app.on_event("shutdown")
+def shutdown_jobs():
+    jobs.shutdown()
 
 from .mongo_utils import mongodb
 
 @app.post("/backtests", response_model=BacktestCreateResponse)
 async def create_backtest(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     params_json: str = Form(None),
     category: str = Form("Other"),
@@ -86,80 +111,182 @@ async def create_backtest(
     bt_id = uuid.uuid4().hex
     stored_csv = os.path.join(DOWNLOAD_DIR, f"upload_{bt_id}.csv")
 
-    contents = await file.read()
-    with open(stored_csv, "wb") as f:
-        f.write(contents)
-
-    ok, msg, rows = validate_csv(stored_csv)
-    if not ok:
-        os.remove(stored_csv)
-        raise HTTPException(status_code=400, detail=msg)
-
-    normalize_ohlc_headers(stored_csv)
+    # Stream to disk, validating the header, counting rows, normalizing
+    # column names and hashing in one pass
+    try:
+        ingest = await save_upload(file, stored_csv, CsvIngest())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = ingest.rows
 
     # Parse params
     try:
         params = BacktestParams.model_validate_json(params_json) if params_json else BacktestParams()
     except ValidationError as e:
+        os.remove(stored_csv)
         raise HTTPException(status_code=400, detail=str(e))
 
-    # Persist a record with status running
-    db = SessionLocal()
+    # Same data and params as an earlier run: reuse its outputs
+    key = result_key(ingest.digest, params.model_dump())
+    cached = await run_db(lookup_result, key)
+
+    # Backpressure: refuse new work instead of queueing without bound. The
+    # slot is reserved now, as other requests may fill the queue while this
+    # one awaits the database
+    if not cached:
+        try:
+            jobs.reserve(bt_id)
+        except QueueFull:
+            os.remove(stored_csv)
+            raise HTTPException(
+                status_code=503,
+                detail="Too many backtests in progress, please retry shortly.",
+                headers={"Retry-After": "5"},
+            )
+
+    if cached:
+        # Same data as the cached run: point at its upload and drop this copy
+        source = await run_db(repository.get_backtest, cached["backtest_id"])
+        if source and source.stored_csv_path != stored_csv and os.path.exists(source.stored_csv_path):
+            os.remove(stored_csv)
+            stored_csv = source.stored_csv_path
+        cached_trades = await run_db(load_trades, cached)
+        if not await run_db(copy_trades, cached["backtest_id"], bt_id):
+            await run_db(save_trades, bt_id, records_to_columns(cached_trades))
+
+    # Persist a record with status queued
+    fields = dict(
+        id=bt_id,
+        original_filename=file.filename,
+        stored_csv_path=stored_csv,
+        params=params.model_dump(),
+        status="completed" if cached else "queued",
+        rows=rows,
+        size_bytes=ingest.size,
+    )
+    if cached:
+        fields.update(
+            metrics=cached["metrics"],
+            equity_curve=cached["equity_curve"],
+            monthly_returns=cached["monthly_returns"],
+            trades_csv_path=cached["trades_csv_path"],
+            metrics_csv_path=cached["metrics_csv_path"],
+        )
     try:
-        bt = Backtest(
-            id=bt_id,
-            original_filename=file.filename,
-            stored_csv_path=stored_csv,
-            params=params.model_dump(),
-            status="running",
-            rows=rows,
-            size_bytes=len(contents),
+        await run_db(repository.add_backtest, **fields)
+    except Exception:
+        jobs.release(bt_id)
+        raise
+
+    if cached:
+        background_tasks.add_task(
+            save_backtest_to_mongo,
+            bt_id, stored_csv, params.model_dump(), file.filename, symbol, category, rows, ingest.size,
+            {
+                "metrics": cached["metrics"],
+                "trades": cached_trades,
+                "equity_curve": cached["equity_curve"],
+                "monthly_returns": cached["monthly_returns"],
+                "trades_csv_path": cached["trades_csv_path"],
+                "metrics_csv_path": cached["metrics_csv_path"],
+            },
         )
-        db.add(bt)
-        db.commit()
-    finally:
-        db.close()
+        return {"id": bt_id, "status": "completed"}
 
-    # Run backtest synchronously for now
+    jobs.submit(bt_id, run_backtest_job(
+        bt_id, key, stored_csv, params.model_dump(), file.filename, symbol, category, rows, ingest.size
+    ))
+    return {"id": bt_id, "status": "queued"}
+
+
+def progress_file(bt_id: str) -> ProgressFile:
+    return ProgressFile(os.path.join(PROGRESS_DIR, f"{bt_id}.json"))
+
+
+async def run_backtest_job(
+    bt_id: str,
+    key: str,
+    stored_csv: str,
+    params: Dict[str, Any],
+    filename: str,
+    symbol: str,
+    category: str,
+    rows: int,
+    size_bytes: int,
+):
+    """
+    Background part of POST /backtests: queued -> running -> completed/failed
+    """
+    progress = progress_file(bt_id)
     try:
-        payload, trades_csv, metrics_csv, chart_data = run_backtest_to_outputs(
-            stored_csv, params.model_dump(), DOWNLOAD_DIR
+        payload, trades_csv, metrics_csv, chart_data = await jobs.run(
+            run_backtest_to_outputs, stored_csv, params, DOWNLOAD_DIR, CACHE_DIR, progress, STRATEGY_WORKERS, True,
+            on_start=lambda: run_db(update_backtest, bt_id, status="running"),
+        )
+        # Trades go to the trade store before the job is seen as completed
+        await run_db(save_trades, bt_id, payload["trades"])
+        await run_db(
+            update_backtest,
+            bt_id,
+            status="completed",
+            metrics=payload["metrics"],
+            equity_curve=chart_data.get("equity_curve"),
+            monthly_returns=chart_data.get("monthly_returns"),
+            trades_csv_path=trades_csv,
+            metrics_csv_path=metrics_csv,
         )
     except Exception as e:
-        db = SessionLocal()
+        await run_db(update_backtest, bt_id, status="failed", error=str(e))
+        # Nothing serves a failed backtest's dataset
         try:
-            bt = db.get(Backtest, bt_id)
-            if bt:
-                bt.status = "failed"
-                bt.error = str(e)
-                db.commit()
-        finally:
-            db.close()
-        raise HTTPException(status_code=500, detail=f"Backtest failed: {e}")
-
-    # Save results
-    db = SessionLocal()
-    try:
-        bt = db.get(Backtest, bt_id)
-        bt.status = "completed"
-        bt.metrics = payload["metrics"]
-        bt.equity_curve = chart_data.get("equity_curve")
-        bt.monthly_returns = chart_data.get("monthly_returns")
-        bt.trades_csv_path = trades_csv
-        bt.metrics_csv_path = metrics_csv
-        db.commit()
+            os.remove(stored_csv)
+        except OSError:
+            pass
+        return
     finally:
-        db.close()
+        # Only once the status is final: until then the progress stream
+        # keeps showing the last snapshot
+        progress.remove()
 
-    # Automatically save to MongoDB
+    try:
+        await run_db(store_result, key, bt_id, payload, trades_csv, metrics_csv, chart_data)
+    except Exception as e:
+        print(f"Warning: Failed to cache backtest results: {e}")
+
+    # The MongoDB copy may be slow to time out; the job's slot is freed now
+    jobs.follow_up(save_backtest_to_mongo(
+        bt_id, stored_csv, params, filename, symbol, category, rows, size_bytes,
+        {
+            "metrics": payload["metrics"],
+            "trades": columns_to_records(payload["trades"]),
+            "equity_curve": chart_data.get("equity_curve"),
+            "monthly_returns": chart_data.get("monthly_returns"),
+            "trades_csv_path": trades_csv,
+            "metrics_csv_path": metrics_csv,
+        },
+    ))
+
+
+async def save_backtest_to_mongo(
+    bt_id: str,
+    stored_csv: str,
+    params: Dict[str, Any],
+    filename: str,
+    symbol: str,
+    category: str,
+    rows: int,
+    size_bytes: int,
+    results: Dict[str, Any],
+):
+    """Automatically save a completed backtest to MongoDB"""
     try:
         # Save file metadata
         file_metadata = {
-            "filename": file.filename,
+            "filename": filename,
             "symbol": symbol,
             "category": category,
             "row_count": rows,
-            "size_mb": round(len(contents) / (1024 * 1024), 2),
+            "size_mb": round(size_bytes / (1024 * 1024), 2),
             "columns": [],  # Will be filled by the normalize function
             "validated": True,
             "file_path": stored_csv
@@ -169,18 +296,13 @@ async def create_backtest(
         # Prepare historical data for MongoDB
         historical_data = {
             "backtest_id": bt_id,
-            "strategy_name": "EMA Crossover Strategy",
+            "strategy_name": strategy_name(params),
             "timestamp": datetime.utcnow(),
-            "original_filename": file.filename,
+            "original_filename": filename,
             "symbol": symbol,
             "category": category,
-            "parameters": params.model_dump(),
-            "metrics": payload["metrics"],
-            "trades": payload["trades"],
-            "equity_curve": chart_data.get("equity_curve"),
-            "monthly_returns": chart_data.get("monthly_returns"),
-            "trades_csv_path": trades_csv,
-            "metrics_csv_path": metrics_csv,
+            "parameters": params,
+            **results,
             "status": "completed",
             "file_metadata_id": saved_file_meta.get('file_id')
         }
@@ -190,66 +312,204 @@ async def create_backtest(
         print(f"✓ Backtest results automatically saved to MongoDB with ID: {bt_id}")
     except Exception as mongo_err:
         print(f"Warning: Failed to save to MongoDB: {mongo_err}")
-        # Don't fail the request if MongoDB save fails
-
-    return {"id": bt_id}
+        # Don't fail the job if MongoDB save fails
 
 @app.get("/backtests")
-async def list_backtests():
-    db = SessionLocal()
+async def list_backtests(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    """
+    Backtests, newest first, `limit` per page. Pass the returned next_cursor
+    back as `cursor` for the following page; it is null on the last one.
+    """
     try:
-        rows = db.query(Backtest).order_by(Backtest.created_at.desc()).all()
-        out = []
-        for r in rows:
-            out.append({
-                "id": r.id,
-                "created_at": r.created_at,
-                "filename": r.original_filename,
-                "status": r.status,
-                "rows": r.rows,
-                "size_bytes": r.size_bytes,
-            })
-        return out
-    finally:
-        db.close()
+        return await run_db(repository.list_backtests, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/backtests/{bt_id}")
-async def get_backtest(bt_id: str):
-    db = SessionLocal()
+async def ensure_trades(r: Backtest) -> None:
+    # Backtests finished before the trade store existed only have their
+    # trades in MongoDB; copy them over on first access
+    if not (r.metrics or {}).get("total_trades") or await run_db(has_trades, r.id):
+        return
     try:
-        r = db.get(Backtest, bt_id)
-        if not r:
-            raise HTTPException(status_code=404, detail="Not found")
-        if r.status != "completed":
-            return {"status": r.status, "error": r.error}
+        mongo_doc = await mongodb.historical_data.find_one({"backtest_id": r.id}, {"trades": 1})
+        if mongo_doc and mongo_doc.get("trades"):
+            await run_db(save_trades, r.id, records_to_columns(mongo_doc["trades"]))
+    except Exception as e:
+        print(f"Could not fetch trades from MongoDB: {e}")
 
-        def dl(path: str) -> str:
-            return f"/downloads/{os.path.basename(path)}"
 
-        # Try to get trades from MongoDB if available
-        trades_data = []
-        try:
-            # Query MongoDB for this specific backtest
-            mongo_doc = await mongodb.historical_data.find_one({"backtest_id": bt_id})
-            if mongo_doc and 'trades' in mongo_doc:
-                trades_data = mongo_doc['trades']
-        except Exception as e:
-            print(f"Could not fetch trades from MongoDB: {e}")
-        
-        return {
-            "trades": trades_data,  # Include trades for charts
-            "metrics": r.metrics or {},
-            "chart_data": {
-                "equity_curve": r.equity_curve or {"dates": [], "balance": []},
-                "monthly_returns": r.monthly_returns or {"months": [], "pnl": []},
-            },
-            "download_links": {
-                "trades_csv": dl(r.trades_csv_path) if r.trades_csv_path else None,
-                "metrics_csv": dl(r.metrics_csv_path) if r.metrics_csv_path else None,
-            },
-        }
-    finally:
-        db.close()
+def trades_body(trades: List[Dict[str, Any]], trades_format: str) -> Any:
+    return records_to_columns(trades) if trades_format == "columns" else trades
+
+
+@app.get("/backtests/{bt_id}")
+async def get_backtest(
+    bt_id: str,
+    include_trades: bool = False,
+    trades_format: str = Query("records", pattern="^(records|columns)$"),
+    max_points: int = Query(CHART_MAX_POINTS, ge=0, le=100_000),
+    resolution: Optional[str] = Query(None, pattern="^(" + "|".join(CANDLE_TIMEFRAMES) + ")$"),
+):
+    """
+    Results of a backtest, without its trades: those are served page by
+    page from GET /backtests/{bt_id}/trades. include_trades=true embeds all
+    of them; trades_format=columns returns them as one list per field.
+
+    The equity curve is sampled to one point per `resolution` period if
+    given, then reduced to at most `max_points` with LTTB (0 = every trade).
+    """
+    r = await run_db(repository.get_backtest, bt_id)
+    if not r:
+        raise HTTPException(status_code=404, detail="Not found")
+    if r.status != "completed":
+        return {"status": r.status, "error": r.error}
+
+    def dl(path: str) -> str:
+        return f"/downloads/{os.path.basename(path)}"
+
+    body = {
+        "metrics": r.metrics or {},
+        "chart_data": {
+            "equity_curve": downsample_curve(r.equity_curve or {"dates": [], "balance": []}, max_points, resolution),
+            "monthly_returns": r.monthly_returns or {"months": [], "pnl": []},
+        },
+        "download_links": {
+            "trades_csv": dl(r.trades_csv_path) if r.trades_csv_path else None,
+            "metrics_csv": dl(r.metrics_csv_path) if r.metrics_csv_path else None,
+        },
+        "trades_url": f"/backtests/{bt_id}/trades",
+        "chart_url": f"/backtests/{bt_id}/chart",
+    }
+    if include_trades:
+        await ensure_trades(r)
+        _, trades = await run_db(query_trades, bt_id, limit=None)
+        body["trades"] = trades_body(trades, trades_format)
+
+    # Already plain JSON; JSONResponse skips the per-item encoder pass
+    return JSONResponse(body)
+
+
+@app.get("/backtests/{bt_id}/trades")
+async def get_backtest_trades(
+    bt_id: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=1000),
+    sort: str = Query("seq", pattern="^(" + "|".join(TRADE_SORTS) + ")$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    outcome: Optional[str] = Query(None, pattern="^(TP|SL)$"),
+    position: Optional[str] = Query(None, pattern="^(long|short)$"),
+    result: Optional[str] = Query(None, pattern="^(wins|losses)$"),
+    trades_format: str = Query("records", pattern="^(records|columns)$"),
+):
+    """
+    One page of a backtest's trades, sorted and filtered in the database.
+    total is the number of trades matching the filters.
+    """
+    r = await run_db(repository.get_backtest, bt_id)
+    if not r:
+        raise HTTPException(status_code=404, detail="Not found")
+    if r.status != "completed":
+        return {"status": r.status, "error": r.error}
+    await ensure_trades(r)
+
+    total, trades = await run_db(
+        query_trades, bt_id, (page - 1) * page_size, page_size, sort, order == "desc", outcome, position, result
+    )
+    return JSONResponse({
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "trades": trades_body(trades, trades_format),
+    })
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Stored bar times are naive UTC; an offset-aware bound is converted first
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+@app.get("/backtests/{bt_id}/chart")
+async def get_backtest_chart(
+    bt_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = Query("auto", pattern="^(auto|" + "|".join(CANDLE_TIMEFRAMES) + ")$"),
+    max_points: int = Query(CHART_MAX_POINTS, ge=10, le=20_000),
+):
+    """
+    Candle/EMA/trade-marker chart (Plotly figure JSON) of [start, end) of a
+    completed backtest, rendered on demand from the stored dataset.
+    Candles use the finest timeframe, from `resolution` up, that fits in
+    max_points. Rendered charts are cached per backtest, range and
+    resolution; least recently used ones are evicted.
+    """
+    start = naive_utc(start)
+    end = naive_utc(end)
+    if start and end and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    r = await run_db(repository.get_backtest, bt_id)
+    if not r:
+        raise HTTPException(status_code=404, detail="Not found")
+    if r.status != "completed":
+        return {"status": r.status, "error": r.error}
+    await ensure_trades(r)
+
+    key = chart_key(bt_id, start=start, end=end, resolution=resolution, max_points=max_points)
+    body = await asyncio.to_thread(load_chart, CHART_DIR, key)
+    if body is None:
+        if not os.path.exists(r.stored_csv_path):
+            raise HTTPException(status_code=410, detail="The dataset of this backtest is no longer stored")
+        first, last = format_times([start, end])  # "" when open-ended
+        trades = await run_db(trades_between, bt_id, first or None, last or None)
+        body = await asyncio.to_thread(
+            render_chart, r.stored_csv_path, r.params, trades, start, end, max_points,
+            None if resolution == "auto" else resolution, CACHE_DIR,
+        )
+        await asyncio.to_thread(store_chart, CHART_DIR, key, body)
+    return Response(body, media_type="application/json")
+
+
+PROGRESS_INTERVAL = 0.5
+
+
+@app.get("/backtests/{bt_id}/progress")
+async def backtest_progress(bt_id: str):
+    """
+    Server-Sent Events stream of a backtest's progress.
+
+    Each event is the job status plus the latest snapshot from the worker
+    (stage, bars / total_bars, trades, bars_per_sec, eta in seconds). The
+    stream ends with a completed or failed event.
+    """
+    if await run_db(backtest_status, bt_id) is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    progress = progress_file(bt_id)
+
+    async def events():
+        last = None
+        while True:
+            event = await run_db(backtest_status, bt_id) or {"status": "failed", "error": "Not found"}
+            if event["status"] in ("queued", "running"):
+                event.update(progress.read() or {})
+            if event != last:
+                yield f"data: {json.dumps(event)}\n\n"
+                last = event
+            if event["status"] not in ("queued", "running"):
+                return
+            await asyncio.sleep(PROGRESS_INTERVAL)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @app.get("/download/{filename}")
 async def download_file(filename: str):
@@ -278,24 +538,15 @@ async def upload_file(
     Upload a CSV file and save its metadata to MongoDB
     """
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Parse CSV to get columns and row count
-        csv_content = io.StringIO(content.decode('utf-8'))
-        csv_reader = csv.reader(csv_content)
-        
-        # Get header and count rows
-        columns = next(csv_reader, [])
-        row_count = sum(1 for _ in csv_reader)  # Count remaining rows
-        
-        # Save file to uploads directory
+        # Stream to the uploads directory, reading the header and counting
+        # rows on the way (stored as uploaded, no validation or renaming)
         file_path = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_path, "wb") as f:
-            f.write(content)
+        ingest = await save_upload(file, file_path, CsvIngest(validate=False, normalize=False, max_bytes=None))
+        columns = ingest.columns or []
+        row_count = ingest.rows
         
         # Calculate file size in MB
-        size_mb = os.path.getsize(file_path) / (1024 * 1024)
+        size_mb = ingest.size / (1024 * 1024)
         
         # Create file metadata
         file_metadata = {
@@ -318,6 +569,8 @@ async def upload_file(
             "file_metadata": result
         }
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,57 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Optional
+
+CHART_CACHE_MAX_BYTES = int(os.getenv("CHART_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+def chart_key(bt_id: str, **request: Any) -> str:
+    """File name of a rendered chart: backtest id plus a digest of the request"""
+    canonical = json.dumps(request, sort_keys=True, default=str, separators=(",", ":"))
+    return f"{bt_id}_{hashlib.sha256(canonical.encode()).hexdigest()[:32]}.json"
+
+
+def load_chart(folder: str, key: str) -> Optional[str]:
+    # A hit refreshes the file's mtime, which orders eviction
+    path = os.path.join(folder, key)
+    try:
+        with open(path) as f:
+            body = f.read()
+        os.utime(path)
+        return body
+    except OSError:
+        return None
+
+
+def store_chart(folder: str, key: str, body: str) -> None:
+    """Write a rendered chart atomically, then evict"""
+    # Unique temp name: the same chart may be rendered by two requests at once
+    fd, tmp = tempfile.mkstemp(prefix=f"{key}.tmp-", dir=folder)
+    with os.fdopen(fd, "w") as f:
+        f.write(body)
+    os.replace(tmp, os.path.join(folder, key))
+    evict_charts(folder)
+
+
+def evict_charts(folder: str, max_bytes: int = CHART_CACHE_MAX_BYTES) -> int:
+    """Delete least recently used charts until the folder fits in max_bytes"""
+    entries: Dict[str, os.stat_result] = {}
+    for name in os.listdir(folder):
+        if name.endswith(".json"):
+            try:
+                entries[name] = os.stat(os.path.join(folder, name))
+            except OSError:
+                pass
+    total = 0
+    evicted = 0
+    for name, stat in sorted(entries.items(), key=lambda item: item[1].st_mtime_ns, reverse=True):
+        total += stat.st_size
+        if total > max_bytes:
+            try:
+                os.remove(os.path.join(folder, name))
+                evicted += 1
+            except OSError:
+                pass
+    return evicted
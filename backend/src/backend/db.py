@@ -1,12 +1,33 @@
+import asyncio
 import os
-from sqlalchemy import create_engine
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./backtests.db")
+# Log every SQL statement; off by default, it is costly on the request path
+DB_ECHO = os.getenv("DB_ECHO", "").lower() in ("1", "true", "yes")
+# Threads running blocking database calls for the async handlers
+DB_THREADS = int(os.getenv("DB_THREADS", 8))
 
 # For SQLite, need check_same_thread=False for FastAPI default threading model
 connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(DATABASE_URL, echo=True, future=True, connect_args=connect_args)
+engine = create_engine(DATABASE_URL, echo=DB_ECHO, future=True, connect_args=connect_args)
+
+if DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers run while a job writes its results; NORMAL sync
+        # is durable at checkpoints, which is enough for a results registry
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-65536")  # 64 MB
+        cursor.close()
 
 # Create a base class for declarative class definitions
 Base = declarative_base()
@@ -14,6 +35,29 @@ Base = declarative_base()
 # Create a session factory
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="db")
+
+T = TypeVar("T")
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking database function on the DB thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+# ix_trades_backtest_pnl_seq also covers the seq tie-break of pnl sorts
+REPLACED_INDEXES = ["ix_trades_backtest_pnl"]
+
+
 def init_db():
     from .models import Base  # noqa: F401
     Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist; add indexes declared since
+    # and drop the ones they replace
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        for name in REPLACED_INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
@@ -0,0 +1,97 @@
+import asyncio
+import inspect
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", 2))
+BACKTEST_QUEUE_SIZE = int(os.getenv("BACKTEST_QUEUE_SIZE", 16))
+# Processes one job may use to run compared strategies in parallel
+STRATEGY_WORKERS = int(os.getenv("STRATEGY_WORKERS", max(1, (os.cpu_count() or 1) // max(1, BACKTEST_WORKERS))))
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobQueue:
+    """
+    In-process stand-in for a job broker.
+
+    Submitted jobs are asyncio tasks tracked by id; the CPU-bound part of
+    each job goes through `run`, which waits for one of `max_workers` slots
+    and executes the function in a process pool so the event loop never
+    blocks. At most `max_pending` jobs (queued + running) are accepted.
+    """
+
+    def __init__(self, max_workers: int = BACKTEST_WORKERS, max_pending: int = BACKTEST_QUEUE_SIZE):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(1, max_pending)
+        self._slots = asyncio.Semaphore(self.max_workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._reserved: Set[str] = set()
+        self._followups: Set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks) + len(self._reserved)
+
+    def full(self) -> bool:
+        return self.pending >= self.max_pending
+
+    def reserve(self, job_id: str) -> None:
+        """
+        Hold a pending slot for a job submitted after some awaits; raises
+        QueueFull when at capacity. Release it if the job is not submitted.
+        """
+        if self.full():
+            raise QueueFull(f"{self.pending} backtests already pending")
+        self._reserved.add(job_id)
+
+    def release(self, job_id: str) -> None:
+        self._reserved.discard(job_id)
+
+    def submit(self, job_id: str, job: Awaitable[Any]) -> None:
+        """Schedule a job coroutine in its reserved slot or a free one; raises QueueFull when at capacity"""
+        if job_id in self._reserved:
+            self._reserved.discard(job_id)
+        elif self.full():
+            if asyncio.iscoroutine(job):
+                job.close()
+            raise QueueFull(f"{self.pending} backtests already pending")
+        task = asyncio.get_running_loop().create_task(job)
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    def follow_up(self, work: Awaitable[Any]) -> None:
+        """Schedule work left after a job's final status (e.g. copies to
+        other stores); it does not hold a pending slot"""
+        task = asyncio.get_running_loop().create_task(work)
+        self._followups.add(task)
+        task.add_done_callback(self._followups.discard)
+
+    async def run(self, fn: Callable[..., Any], *args: Any, on_start: Optional[Callable[[], Any]] = None) -> Any:
+        """Run fn(*args) in a worker process once a slot is free"""
+        async with self._slots:
+            if on_start:
+                started = on_start()
+                if inspect.isawaitable(started):
+                    await started
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool(), fn, *args)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def shutdown(self) -> None:
+        for task in [*self._tasks.values(), *self._followups]:
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+jobs = JobQueue()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, JSON, Integer
+from sqlalchemy import Column, String, DateTime, JSON, Integer, Float, Index
 from sqlalchemy.sql import func
 from .db import Base
 
@@ -18,7 +18,56 @@ class Backtest(Base):
     trades_csv_path = Column(String, nullable=True)
     metrics_csv_path = Column(String, nullable=True)
 
-    status = Column(String, default="completed")  # completed | failed | running
+    status = Column(String, default="completed")  # queued | running | completed | failed
     error = Column(String, nullable=True)
     rows = Column(Integer, nullable=True)
     size_bytes = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        # Keyset pagination of GET /backtests, newest first
+        Index("ix_backtests_created_at_id", "created_at", "id"),
+    )
+
+
+class CachedResult(Base):
+    """Outputs of a backtest keyed by data digest + canonical params"""
+    __tablename__ = "result_cache"
+
+    key = Column(String, primary_key=True)
+    backtest_id = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    metrics = Column(JSON, nullable=True)
+    equity_curve = Column(JSON, nullable=True)
+    monthly_returns = Column(JSON, nullable=True)
+
+    trades_csv_path = Column(String, nullable=False)
+    metrics_csv_path = Column(String, nullable=False)
+    trades_json_path = Column(String, nullable=False)
+    size_bytes = Column(Integer, nullable=False, default=0)
+
+
+class Trade(Base):
+    """One closed trade of a backtest, stored for paged queries"""
+    __tablename__ = "trades"
+
+    backtest_id = Column(String, primary_key=True)
+    seq = Column(Integer, primary_key=True)  # trade number in entry order, from 0
+
+    entry_time = Column(String, nullable=False)
+    position = Column(String, nullable=False)  # long | short
+    entry_price = Column(Float, nullable=True)
+    sl_price = Column(Float, nullable=True)
+    tp_price = Column(Float, nullable=True)
+    exit_time = Column(String, nullable=False)
+    exit_reason = Column(String, nullable=False)  # TP | SL
+    exit_price = Column(Float, nullable=True)
+    pnl = Column(Float, nullable=True)
+    cumulative_pnl = Column(Float, nullable=True)
+
+    __table_args__ = (
+        Index("ix_trades_backtest_pnl_seq", "backtest_id", "pnl", "seq"),
+        Index("ix_trades_backtest_reason", "backtest_id", "exit_reason", "seq"),
+        Index("ix_trades_backtest_position", "backtest_id", "position", "seq"),
+    )
@@ -0,0 +1,35 @@
+import json
+import os
+from typing import Any, Dict, Optional
+
+
+class ProgressFile:
+    """
+    Progress sink shared between a worker process and the API.
+
+    Calling the instance with a dict writes it as JSON to `path`
+    (atomically, via a temp file and rename), so the SSE endpoint can read
+    the latest snapshot while the job runs in another process.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __call__(self, payload: Dict[str, Any]) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp, self.path)
+
+    def read(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,129 @@
+import base64
+import binascii
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import String, or_, select, type_coerce
+
+from .db import SessionLocal
+from .models import Backtest
+
+# Blocking accessors of the backtests table; async handlers call them
+# through db.run_db so the event loop never waits on SQLite.
+
+
+def add_backtest(**fields: Any) -> None:
+    db = SessionLocal()
+    try:
+        db.add(Backtest(**fields))
+        db.commit()
+    finally:
+        db.close()
+
+
+def get_backtest(bt_id: str) -> Optional[Backtest]:
+    # Detached instance with every column loaded
+    db = SessionLocal()
+    try:
+        return db.get(Backtest, bt_id)
+    finally:
+        db.close()
+
+
+def update_backtest(bt_id: str, **fields: Any) -> None:
+    db = SessionLocal()
+    try:
+        bt = db.get(Backtest, bt_id)
+        if bt:
+            for key, value in fields.items():
+                setattr(bt, key, value)
+            db.commit()
+    finally:
+        db.close()
+
+
+def fail_interrupted() -> int:
+    """Mark backtests left queued or running as failed; returns how many"""
+    db = SessionLocal()
+    try:
+        count = (
+            db.query(Backtest)
+            .filter(Backtest.status.in_(["queued", "running"]))
+            .update({"status": "failed", "error": "Interrupted by a server restart"}, synchronize_session=False)
+        )
+        db.commit()
+        return count
+    finally:
+        db.close()
+
+
+def backtest_status(bt_id: str) -> Optional[Dict[str, Any]]:
+    db = SessionLocal()
+    try:
+        row = db.query(Backtest.status, Backtest.error).filter(Backtest.id == bt_id).first()
+        if not row:
+            return None
+        return {"status": row.status, "error": row.error}
+    finally:
+        db.close()
+
+
+def list_backtests(limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    One page of backtest summaries, newest first, plus the cursor of the
+    next page (None on the last one). Only the summary columns are read and
+    the page is found on the (created_at, id) index, so the cost does not
+    grow with the table.
+    """
+    # Raw stored value of created_at for the cursor: SQLite keeps it as text
+    # and a datetime bind would not compare equal to it
+    created_key = type_coerce(Backtest.created_at, String)
+    query = select(
+        Backtest.id, Backtest.created_at, created_key.label("created_key"), Backtest.original_filename,
+        Backtest.status, Backtest.rows, Backtest.size_bytes,
+    )
+    if cursor:
+        after_created, after_id = decode_cursor(cursor)
+        # The leading <= lets the database seek the index instead of scanning it
+        query = query.where(
+            created_key <= after_created,
+            or_(created_key < after_created, Backtest.id < after_id),
+        )
+    query = query.order_by(Backtest.created_at.desc(), Backtest.id.desc()).limit(limit + 1)
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(query).all()
+    finally:
+        db.close()
+
+    next_cursor = encode_cursor(rows[limit - 1].created_key, rows[limit - 1].id) if len(rows) > limit else None
+    return {
+        "backtests": [
+            {
+                "id": r.id,
+                "created_at": r.created_at,
+                "filename": r.original_filename,
+                "status": r.status,
+                "rows": r.rows,
+                "size_bytes": r.size_bytes,
+            }
+            for r in rows[:limit]
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+def encode_cursor(created: Any, bt_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([str(created), bt_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Raises ValueError on a malformed cursor"""
+    try:
+        created, bt_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(created, str) or not isinstance(bt_id, str):
+        raise ValueError("Invalid cursor")
+    return created, bt_id
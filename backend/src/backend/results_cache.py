@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .db import SessionLocal
+from .models import Backtest, CachedResult
+from .strategy_adapter import columns_to_records
+
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+
+
+def result_key(data_digest: str, params: Dict[str, Any]) -> str:
+    """Digest of the normalized CSV plus the canonical JSON of the params"""
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{data_digest}:{canonical}".encode()).hexdigest()
+
+
+def _paths(entry: CachedResult) -> List[str]:
+    return [entry.trades_csv_path, entry.metrics_csv_path, entry.trades_json_path]
+
+
+def _upload_path(db, entry: CachedResult) -> Optional[str]:
+    # Uploaded dataset of the backtest that produced the entry; cache hits
+    # point their backtests at the same file
+    bt = db.get(Backtest, entry.backtest_id)
+    return bt.stored_csv_path if bt else None
+
+
+def _drop(db, entry: CachedResult) -> None:
+    """
+    Delete an entry with its output files and its upload. Backtests whose
+    download links pointed at those files get none rather than dead ones;
+    their charts report the dataset as no longer stored.
+    """
+    for path in _paths(entry) + [_upload_path(db, entry)]:
+        try:
+            if path:
+                os.remove(path)
+        except OSError:
+            pass
+    (
+        db.query(Backtest)
+        .filter(Backtest.trades_csv_path == entry.trades_csv_path)
+        .update({"trades_csv_path": None, "metrics_csv_path": None}, synchronize_session=False)
+    )
+    db.delete(entry)
+
+
+def lookup_result(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the cached outputs for `key` and mark them recently used, or None.
+    Entries whose files have gone missing are dropped.
+    """
+    db = SessionLocal()
+    try:
+        entry = db.get(CachedResult, key)
+        if not entry:
+            return None
+        if not all(os.path.exists(p) for p in _paths(entry)):
+            _drop(db, entry)
+            db.commit()
+            return None
+        entry.last_used_at = datetime.utcnow()
+        db.commit()
+        return {
+            "backtest_id": entry.backtest_id,
+            "metrics": entry.metrics,
+            "equity_curve": entry.equity_curve,
+            "monthly_returns": entry.monthly_returns,
+            "trades_csv_path": entry.trades_csv_path,
+            "metrics_csv_path": entry.metrics_csv_path,
+            "trades_json_path": entry.trades_json_path,
+        }
+    finally:
+        db.close()
+
+
+def load_trades(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # Trades are stored column-wise; entries cached as rows are returned as is
+    with open(result["trades_json_path"]) as f:
+        trades = json.load(f)
+    return columns_to_records(trades) if isinstance(trades, dict) else trades
+
+
+def store_result(
+    key: str,
+    bt_id: str,
+    payload: Dict[str, Any],
+    trades_csv: str,
+    metrics_csv: str,
+    chart_data: Dict[str, Any],
+) -> None:
+    """
+    Record a finished backtest's outputs under `key`, then evict. The entry's
+    size includes the backtest's upload, which is dropped with it.
+    """
+    trades_json = os.path.splitext(trades_csv)[0] + ".json"
+    with open(trades_json, "w") as f:
+        json.dump(payload["trades"], f)
+
+    db = SessionLocal()
+    try:
+        previous = db.get(CachedResult, key)
+        if previous:
+            # Same result computed twice concurrently; keep the older files
+            os.remove(trades_json)
+            return
+        bt = db.get(Backtest, bt_id)
+        files = [trades_csv, metrics_csv, trades_json, bt.stored_csv_path if bt else None]
+        db.add(CachedResult(
+            key=key,
+            backtest_id=bt_id,
+            metrics=payload["metrics"],
+            equity_curve=chart_data.get("equity_curve"),
+            monthly_returns=chart_data.get("monthly_returns"),
+            trades_csv_path=trades_csv,
+            metrics_csv_path=metrics_csv,
+            trades_json_path=trades_json,
+            size_bytes=sum(os.path.getsize(p) for p in files if p and os.path.exists(p)),
+        ))
+        db.commit()
+    finally:
+        db.close()
+    evict_results()
+
+
+def evict_results(max_bytes: int = RESULT_CACHE_MAX_BYTES) -> int:
+    """Delete least recently used results until the cache fits in max_bytes"""
+    db = SessionLocal()
+    try:
+        entries = db.query(CachedResult).order_by(CachedResult.last_used_at.desc()).all()
+        total = 0
+        evicted = 0
+        for entry in entries:
+            total += entry.size_bytes or 0
+            if total > max_bytes:
+                _drop(db, entry)
+                evicted += 1
+        db.commit()
+        return evicted
+    finally:
+        db.close()
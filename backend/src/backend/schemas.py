@@ -1,5 +1,32 @@
-from typing import Optional
-from pydantic import BaseModel, Field
+import math
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field, model_validator
+from trail_backtesting import STRATEGIES, strategy_params
+
+class StrategySpec(BaseModel):
+    name: str = "ema_crossover"  # ema_crossover | sma_cross | rsi_reversion
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+    @model_validator(mode="after")
+    def check_registered(self) -> "StrategySpec":
+        # Only registered strategies and their declared numeric params: both
+        # reach the worker and the names of cached columns
+        if self.name not in STRATEGIES:
+            raise ValueError(f"Unknown strategy '{self.name}', expected one of {sorted(STRATEGIES)}")
+        declared = strategy_params(self.name)
+        params = {}
+        for key, value in self.params.items():
+            if key not in declared:
+                raise ValueError(f"Unknown parameter '{key}' for strategy '{self.name}', expected one of {sorted(declared)}")
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value <= 0:
+                raise ValueError(f"Parameter '{key}' of strategy '{self.name}' must be a positive number")
+            if isinstance(declared[key], int):
+                if value != int(value):
+                    raise ValueError(f"Parameter '{key}' of strategy '{self.name}' must be an integer")
+                value = int(value)
+            params[key] = value
+        self.params = params
+        return self
 
 class BacktestParams(BaseModel):
     starting_balance: float = 100000
@@ -13,9 +40,13 @@ class BacktestParams(BaseModel):
     commission_per_trade: float = 5.0
     slippage_ticks: int = 1
     contract_margin: float = 13000
+    strategy: StrategySpec = Field(default_factory=StrategySpec)
+    # Evaluated on the same data in the same job; metrics only
+    compare_strategies: List[StrategySpec] = Field(default_factory=list, max_length=16)
 
 class BacktestCreateResponse(BaseModel):
     id: str
+    status: Optional[str] = None
 
 class DownloadLinks(BaseModel):
     trades_csv: str
@@ -43,6 +74,11 @@ class Metrics(BaseModel):
     sharpe_ratio: float
     best_trade: float
     worst_trade: float
+    # From the bar-level mark-to-market equity, sampled daily
+    daily_sharpe_ratio: float = 0.0
+    daily_sortino_ratio: float = 0.0
+    bar_max_drawdown: float = 0.0
+    bar_max_drawdown_pct: float = 0.0  # percent of the running peak
 
 class Trade(BaseModel):
     entry_time: str
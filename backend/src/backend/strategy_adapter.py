@@ -2,22 +2,215 @@ from __future__ import annotations
 import os
 import uuid
 from datetime import datetime
+import numpy as np
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, Callable, Optional
 from trail_backtesting import (
-    run_backtest,
     load_minute_data,
-    calculate_ema,
-    detect_signals,
-    simulate_trades,
-    analyze_performance,
+    performance_metrics,
+    equity_curve_metrics,
+    open_column_store,
+    bar_arrays,
+    strategy_arrays,
+    simulate_arrays,
+    fills_to_trades,
+    run_strategies,
+    resample_equity,
+    lttb,
+    get_indicator,
+    candle_timeframe,
+    trade_markers,
+    plot_window,
+    CANDLE_TIMEFRAMES,
+    STRATEGIES,
 )
 
+# Size budget of the memory-mapped column stores in the cache folder; least
+# recently used datasets are deleted beyond it
+COLUMN_STORE_MAX_BYTES = int(os.getenv("COLUMN_STORE_MAX_BYTES", 4 * 1024 * 1024 * 1024))
+
 # Prepare outputs per spec
 
-def run_backtest_to_outputs(csv_path: str, params: Dict[str, Any], out_dir: str) -> tuple[dict, str, str, dict]:
+def with_equity(trades_df: pd.DataFrame, starting_balance: float) -> pd.DataFrame:
+    if trades_df.empty:
+        # Ensure required columns exist
+        trades_df = pd.DataFrame(columns=[
+            'Entry Time','Type','Entry Price','Exit Time','Exit Price','Quantity','PNL','Outcome','Balance After Trade'
+        ])
+
+    # Enhance trades_df with cumulative_pnl for equity curve
+    trades_df = trades_df.copy()
+    trades_df['cumulative_pnl'] = trades_df['PNL'].cumsum()
+    trades_df['cumulative_balance'] = starting_balance + trades_df['cumulative_pnl']
+    return trades_df
+
+
+def trade_metrics(trades_df: pd.DataFrame, starting_balance: float) -> dict:
+    # Metrics extended to match required fields, from the shared kernel
+    m = performance_metrics(trades_df['PNL'].to_numpy(dtype=float) if not trades_df.empty else [], starting_balance)
+    if not m:
+        return {
+            "total_trades": 0, "wins": 0, "losses": 0, "win_rate": 0.0, "avg_pnl": 0.0, "total_pnl": 0.0,
+            "avg_win": 0.0, "avg_loss": 0.0, "risk_reward_ratio": 0.0, "max_drawdown": 0.0,
+            "sharpe_ratio": 0.0, "best_trade": 0.0, "worst_trade": 0.0,
+        }
+    return {
+        "total_trades": int(m['total_trades']),
+        "wins": int(m['wins']),
+        "losses": int(m['losses']),
+        "win_rate": float(m['win_rate']),
+        "avg_pnl": float(m['avg_pnl']),
+        "total_pnl": float(m['total_pnl']),
+        **{k: float(m[k]) if m[k] == m[k] else 0.0 for k in (
+            'avg_win', 'avg_loss', 'risk_reward_ratio', 'max_drawdown', 'sharpe_ratio', 'best_trade', 'worst_trade')},
+    }
+
+
+def equity_risk(bars: dict, fills, config: dict) -> dict:
+    # Daily Sharpe/Sortino and bar-level drawdown of the mark-to-market equity
+    risk = equity_curve_metrics(bars, fills, config, 'D')
+    names = {
+        "daily_sharpe_ratio": 'sharpe_ratio',
+        "daily_sortino_ratio": 'sortino_ratio',
+        "bar_max_drawdown": 'max_drawdown',
+        "bar_max_drawdown_pct": 'max_drawdown_pct',
+    }
+    risk['max_drawdown_pct'] *= 100  # percent, like profit_percentage
+    return {key: float(risk[k]) if risk[k] == risk[k] else 0.0 for key, k in names.items()}
+
+
+TRADE_FIELDS = [
+    "entry_time", "position", "entry_price", "sl_price", "tp_price",
+    "exit_time", "exit_reason", "exit_price", "pnl", "cumulative_pnl",
+]
+
+
+def format_times(values) -> list[str]:
+    # '%Y-%m-%d %H:%M:%S' for a whole datetime column at once; NaT -> ""
+    values = np.asarray(values, dtype='datetime64[s]')
+    text = np.datetime_as_string(values, unit='s').astype('U19')
+    text.view('U1').reshape(-1, 19)[:, 10] = ' '  # the ISO 'T' separator
+    text[np.isnat(values)] = ""
+    return text.tolist()
+
+
+def trade_columns(trades_df: pd.DataFrame) -> Dict[str, list]:
+    # Compact column-oriented trades: one list per field of TRADE_FIELDS
+    n = len(trades_df)
+    return {
+        "entry_time": format_times(trades_df['Entry Time']),
+        "position": trades_df['Type'].tolist(),
+        "entry_price": trades_df['Entry Price'].to_numpy(dtype=float).tolist(),
+        "sl_price": [None] * n,
+        "tp_price": [None] * n,
+        "exit_time": format_times(trades_df['Exit Time']),
+        "exit_reason": trades_df['Outcome'].tolist(),
+        "exit_price": trades_df['Exit Price'].to_numpy(dtype=float).tolist(),
+        "pnl": trades_df['PNL'].to_numpy(dtype=float).tolist(),
+        "cumulative_pnl": trades_df['cumulative_pnl'].to_numpy(dtype=float).tolist(),
+    }
+
+
+def columns_to_records(columns: Dict[str, list]) -> list[dict]:
+    return [dict(zip(TRADE_FIELDS, row)) for row in zip(*(columns[f] for f in TRADE_FIELDS))]
+
+
+def records_to_columns(records: list[dict]) -> Dict[str, list]:
+    return {f: [r.get(f) for r in records] for f in TRADE_FIELDS}
+
+
+def downsample_curve(curve: Dict[str, list], max_points: int = 0, resolution: Optional[str] = None) -> Dict[str, list]:
+    """
+    Equity curve ({dates, balance}) for charts: with a resolution ('1h',
+    '1D', ...) the last balance of each period, then at most max_points
+    points picked by LTTB. 0 / None leave the curve as stored.
+    """
+    dates = curve.get("dates") or []
+    if not dates or not (resolution or (max_points and len(dates) > max_points)):
+        return curve
+    times = np.array(dates, dtype='datetime64[s]').astype('datetime64[ns]').view(np.int64)
+    balance = np.asarray(curve["balance"], dtype=float)
+    if resolution:
+        times, balance = resample_equity(times, balance, resolution)
+    if max_points:
+        keep = lttb(times, balance, max_points)
+        times, balance = times[keep], balance[keep]
+    return {"dates": format_times(times.view('datetime64[ns]')), "balance": balance.tolist()}
+
+
+def render_chart(
+    csv_path: str,
+    params: Dict[str, Any],
+    trades: list[dict],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    max_points: int = 2000,
+    resolution: Optional[str] = None,
+    cache_dir: str | None = None,
+) -> str:
+    """
+    Plotly figure JSON of candles, EMA and trade markers for [start, end)
+    of a backtest's dataset. Bars are located by binary search on the
+    stored datetimes; candles use the finest timeframe, from `resolution`
+    up, that fits in max_points.
+    """
+    if cache_dir:
+        source = open_column_store(csv_path, cache_dir, max_bytes=COLUMN_STORE_MAX_BYTES)
+    else:
+        data = load_minute_data(csv_path)
+        source = {c: data[c].to_numpy() for c in data.columns if c != 'symbol'}
+    bars = bar_arrays(source)
+    times = bars['datetime']
+    lo = int(np.searchsorted(times, pd.Timestamp(start).value)) if start else 0
+    hi = int(np.searchsorted(times, pd.Timestamp(end).value)) if end else len(times)
+
+    name, strategy_params = strategy_specs(params)[0]
+    span = strategy_params.get('span', 9) if name == 'ema_crossover' else 9
+    window = {c: np.asarray(v[lo:hi]) for c, v in bars.items()}
+    window['ema9'] = np.asarray(get_indicator(source, 'ema', span=span)[lo:hi])
+
+    trades_df = pd.DataFrame({
+        'Entry Time': pd.to_datetime([t['entry_time'] for t in trades]),
+        'Entry Price': [t['entry_price'] for t in trades],
+        'Type': [t['position'] for t in trades],
+        'Exit Time': pd.to_datetime([t['exit_time'] for t in trades]),
+        'Exit Price': [t['exit_price'] for t in trades],
+    })
+    timeframe = candle_timeframe(window['datetime'], max_points, resolution)
+    span_text = " to ".join(format_times(window['datetime'][[0, -1]].view('datetime64[ns]'))) if hi > lo else "no data"
+    fig = plot_window(window, trade_markers(trades_df), f"{strategy_name(params)} ({span_text})", max_points, timeframe)
+    fig.update_layout(meta={"resolution": timeframe, "bars": hi - lo, "trades": len(trades)})
+    return fig.to_json()
+
+
+def strategy_specs(params: Dict[str, Any]) -> list[tuple[str, dict]]:
+    # Primary strategy first, then the ones it is compared with
+    specs = [params.get('strategy') or {}] + list(params.get('compare_strategies') or [])
+    return [(spec.get('name') or 'ema_crossover', dict(spec.get('params') or {})) for spec in specs]
+
+
+def strategy_name(params: Dict[str, Any]) -> str:
+    name, _ = strategy_specs(params)[0]
+    return STRATEGIES[name].title if name in STRATEGIES else name
+
+def run_backtest_to_outputs(
+    csv_path: str,
+    params: Dict[str, Any],
+    out_dir: str,
+    cache_dir: str | None = None,
+    on_progress: Optional[Callable[[dict], None]] = None,
+    workers: Optional[int] = None,
+    columnar: bool = False,
+) -> tuple[dict, str, str, dict]:
     os.makedirs(out_dir, exist_ok=True)
 
+    def report(stage: str, **fields):
+        if on_progress:
+            on_progress({"stage": stage, **fields})
+
+    def simulating(snapshot: dict):
+        report("simulating", **snapshot)
+
     # Build config for strategy
     config = {
         'starting_balance': params['starting_balance'],
@@ -33,74 +226,50 @@ def run_backtest_to_outputs(csv_path: str, params: Dict[str, Any], out_dir: str)
         'contract_margin': params['contract_margin'],
     }
 
-    data = load_minute_data(csv_path)
-    data = calculate_ema(data)
-    data = detect_signals(data)
-    trades_df = simulate_trades(data, config)
+    report("loading")
+    if cache_dir:
+        # Memory-mapped column store keyed by content hash; indicator and
+        # signal columns are computed once per dataset and reused
+        source = open_column_store(csv_path, cache_dir, max_bytes=COLUMN_STORE_MAX_BYTES)
+    else:
+        data = load_minute_data(csv_path)
+        source = {c: data[c].to_numpy() for c in data.columns if c != 'symbol'}
 
-    # Metrics extended to match required fields
-    metrics_base = analyze_performance(trades_df, initial_balance=config['starting_balance'])
+    specs = strategy_specs(params)
+    comparison = []
+    if len(specs) > 1:
+        # All strategies share the loaded data and run in parallel
+        report("simulating", strategies=len(specs))
+        results = run_strategies(source, specs, config, workers)
+        if results[0][2] is not None:
+            raise ValueError(results[0][2])
+        for (name, strategy_params), (key, fills, error) in zip(specs, results):
+            entry = {"strategy": key, "name": name, "params": strategy_params}
+            if error is None:
+                entry["metrics"] = trade_metrics(fills_to_trades(fills), config['starting_balance'])
+            else:
+                entry["error"] = error
+            comparison.append(entry)
+        fills = results[0][1]
+        bars = bar_arrays(source)
+    else:
+        name, strategy_params = specs[0]
+        bars = strategy_arrays(source, name, **strategy_params)
+        fills = simulate_arrays(bars, config, on_progress=simulating if on_progress else None)
+    trades_df = fills_to_trades(fills)
+    report("reporting", trades=int(len(trades_df)))
 
-    if trades_df.empty:
-        # Ensure required columns exist
-        trades_df = pd.DataFrame(columns=[
-            'Entry Time','Type','Entry Price','Exit Time','Exit Price','Quantity','PNL','Outcome','Balance After Trade'
-        ])
+    metrics_json = trade_metrics(trades_df, config['starting_balance'])
+    metrics_json.update(equity_risk(bars, fills, config))
+    trades_df = with_equity(trades_df, config['starting_balance'])
 
-    # Enhance trades_df with cumulative_pnl for equity curve
-    trades_df = trades_df.copy()
-    trades_df['cumulative_pnl'] = trades_df['PNL'].cumsum()
-    trades_df['cumulative_balance'] = config['starting_balance'] + trades_df['cumulative_pnl']
-
-    # Map to required trades json
-    trades_json = []
-    for _, r in trades_df.iterrows():
-        trades_json.append({
-            "entry_time": r.get('Entry Time').strftime('%Y-%m-%d %H:%M:%S') if pd.notnull(r.get('Entry Time')) else "",
-            "position": r.get('Type',''),
-            "entry_price": float(r.get('Entry Price', 0) or 0),
-            "sl_price": None,
-            "tp_price": None,
-            "exit_time": r.get('Exit Time').strftime('%Y-%m-%d %H:%M:%S') if pd.notnull(r.get('Exit Time')) else "",
-            "exit_reason": r.get('Outcome',''),
-            "exit_price": float(r.get('Exit Price', 0) or 0),
-            "pnl": float(r.get('PNL', 0) or 0),
-            "cumulative_pnl": float(r.get('cumulative_pnl', 0) or 0),
-        })
-
-    # Compute more metrics per spec
+    # Trades json, built column-wise; rows (the default) are zipped from the columns
+    columns = trade_columns(trades_df)
+    trades_json = columns if columnar else columns_to_records(columns)
     total_trades = int(len(trades_df))
-    wins = int((trades_df['PNL'] > 0).sum()) if total_trades else 0
-    losses = total_trades - wins
-    avg_pnl = float(trades_df['PNL'].mean()) if total_trades else 0.0
-    total_pnl = float(trades_df['PNL'].sum()) if total_trades else 0.0
-    avg_win = float(trades_df.loc[trades_df['PNL']>0, 'PNL'].mean()) if wins else 0.0
-    avg_loss = float(trades_df.loc[trades_df['PNL']<0, 'PNL'].mean()) if losses else 0.0
-    rr = abs(avg_win/avg_loss) if avg_loss != 0 else 0.0
-    max_dd = float(trades_df['cumulative_balance'].cummax().sub(trades_df['cumulative_balance']).max()) if total_trades else 0.0
-    # reuse sharpe if present else 0
-    sharpe = float(metrics_base.get('Sharpe Ratio') or 0.0) if metrics_base else 0.0
-    best = float(trades_df['PNL'].max()) if total_trades else 0.0
-    worst = float(trades_df['PNL'].min()) if total_trades else 0.0
-
-    metrics_json = {
-        "total_trades": total_trades,
-        "wins": wins,
-        "losses": losses,
-        "win_rate": float(wins/total_trades) if total_trades else 0.0,
-        "avg_pnl": avg_pnl,
-        "total_pnl": total_pnl,
-        "avg_win": avg_win if avg_win==avg_win else 0.0,
-        "avg_loss": avg_loss if avg_loss==avg_loss else 0.0,
-        "risk_reward_ratio": rr if rr==rr else 0.0,
-        "max_drawdown": max_dd if max_dd==max_dd else 0.0,
-        "sharpe_ratio": sharpe if sharpe==sharpe else 0.0,
-        "best_trade": best if best==best else 0.0,
-        "worst_trade": worst if worst==worst else 0.0,
-    }
 
     # Chart data: equity curve and monthly returns
-    equity_dates = [d.strftime('%Y-%m-%d %H:%M:%S') for d in trades_df['Exit Time'].dt.to_pydatetime()] if total_trades else []
+    equity_dates = format_times(trades_df['Exit Time']) if total_trades else []
     equity_balance = trades_df['cumulative_balance'].astype(float).tolist() if total_trades else []
     equity_curve = {"equity_curve": {"dates": equity_dates, "balance": equity_balance}}
 
@@ -147,12 +316,17 @@ def run_backtest_to_outputs(csv_path: str, params: Dict[str, Any], out_dir: str)
     export_df.to_csv(trades_csv, index=False)
     pd.DataFrame([metrics_json]).to_csv(metrics_csv, index=False)
 
+    if comparison:
+        # Per-strategy metrics; kept out of metrics.csv, which stays one flat row
+        metrics_json["strategies"] = comparison
+
     chart_data = {**equity_curve, **monthly_returns}
 
     payload = {
         "trades": trades_json,
         "metrics": metrics_json,
         "chart_data": chart_data,
+        "strategy_name": strategy_name(params),
     }
 
     return payload, trades_csv, metrics_csv, chart_data
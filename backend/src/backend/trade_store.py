@@ -0,0 +1,101 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, literal, select
+
+from .db import SessionLocal
+from .models import Trade
+from .strategy_adapter import TRADE_FIELDS, columns_to_records
+
+# Columns GET /backtests/{id}/trades can sort by; ties keep trade order
+TRADE_SORTS = ["seq", "entry_time", "exit_time", "entry_price", "exit_price", "pnl", "cumulative_pnl"]
+
+
+def save_trades(bt_id: str, columns: Dict[str, list]) -> int:
+    """Store a backtest's trades (column-wise, see trade_columns) in one executemany"""
+    rows = [
+        {"backtest_id": bt_id, "seq": i, **record}
+        for i, record in enumerate(columns_to_records(columns))
+    ]
+    db = SessionLocal()
+    try:
+        if rows:
+            db.execute(Trade.__table__.insert(), rows)
+        db.commit()
+        return len(rows)
+    finally:
+        db.close()
+
+
+def copy_trades(src_id: str, dst_id: str) -> int:
+    """Copy the stored trades of one backtest to another inside the database"""
+    fields = ["seq"] + TRADE_FIELDS
+    db = SessionLocal()
+    try:
+        source = select(literal(dst_id), *(getattr(Trade, f) for f in fields)).where(Trade.backtest_id == src_id)
+        result = db.execute(insert(Trade).from_select(["backtest_id"] + fields, source))
+        db.commit()
+        return result.rowcount
+    finally:
+        db.close()
+
+
+def has_trades(bt_id: str) -> bool:
+    db = SessionLocal()
+    try:
+        return db.execute(select(Trade.seq).where(Trade.backtest_id == bt_id).limit(1)).first() is not None
+    finally:
+        db.close()
+
+
+def query_trades(
+    bt_id: str,
+    offset: int = 0,
+    limit: Optional[int] = 50,
+    sort: str = "seq",
+    descending: bool = False,
+    outcome: Optional[str] = None,
+    position: Optional[str] = None,
+    result: Optional[str] = None,
+) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    One page of a backtest's trades plus the number of trades matching the
+    filters. outcome is TP/SL, position long/short, result wins/losses;
+    limit=None returns all of them.
+    """
+    conditions = [Trade.backtest_id == bt_id]
+    if outcome:
+        conditions.append(Trade.exit_reason == outcome)
+    if position:
+        conditions.append(Trade.position == position)
+    if result == "wins":
+        conditions.append(Trade.pnl > 0)
+    elif result == "losses":
+        conditions.append(Trade.pnl < 0)
+
+    key = getattr(Trade, sort)
+    order = [key.desc(), Trade.seq.desc()] if descending else [key.asc(), Trade.seq.asc()]
+    columns = [getattr(Trade, f) for f in TRADE_FIELDS]
+
+    db = SessionLocal()
+    try:
+        total = db.execute(select(func.count()).select_from(Trade).where(*conditions)).scalar_one()
+        rows = db.execute(select(*columns).where(*conditions).order_by(*order).offset(offset).limit(limit)).all()
+        return total, [dict(zip(TRADE_FIELDS, row)) for row in rows]
+    finally:
+        db.close()
+
+
+def trades_between(bt_id: str, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Trades entered in [start, end), given as '%Y-%m-%d %H:%M:%S' strings"""
+    conditions = [Trade.backtest_id == bt_id]
+    if start:
+        conditions.append(Trade.entry_time >= start)
+    if end:
+        conditions.append(Trade.entry_time < end)
+    columns = [getattr(Trade, f) for f in TRADE_FIELDS]
+    db = SessionLocal()
+    try:
+        rows = db.execute(select(*columns).where(*conditions).order_by(Trade.seq)).all()
+        return [dict(zip(TRADE_FIELDS, row)) for row in rows]
+    finally:
+        db.close()
@@ -1,6 +1,10 @@
+import csv
+import hashlib
+import io
 import os
+import aiofiles
 import pandas as pd
-from typing import Tuple
+from typing import List, Optional, Tuple
 
 REQUIRED_COL_SETS = [
     {"date_time", "open", "high", "low", "close"},
@@ -9,6 +13,8 @@ REQUIRED_COL_SETS = [
 ]
 
 MAX_SIZE_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 220 * 1024 * 1024))
+# Longest header line accepted; it is buffered until its newline arrives
+MAX_HEADER_BYTES = 64 * 1024
 
 
 def validate_csv(file_path: str) -> Tuple[bool, str, int]:
@@ -52,3 +58,116 @@ def normalize_ohlc_headers(file_path: str) -> str:
         df_iter.rename(columns=rename_map, inplace=True)
         df_iter.to_csv(file_path, index=False)
     return file_path
+
+
+def normalize_header(columns: List[str]) -> List[str]:
+    """Column names as downstream expects them (date_time, lower-case OHLC)"""
+    out = []
+    for c in columns:
+        key = c.strip().lower()
+        if key in ("date time", "datetime"):
+            out.append("date_time")
+        elif key in ("open", "high", "low", "close", "volume", "symbol"):
+            out.append(key)
+        else:
+            out.append(c)
+    return out
+
+
+class CsvIngest:
+    """
+    Single-pass CSV ingest. Raw bytes go in through feed() in chunks of any
+    size; the bytes to store come back out. The header line is validated
+    and normalized (both optional), everything after it passes through
+    unchanged while rows are counted and the output is hashed, so memory
+    stays constant regardless of file size (the header line is capped at
+    MAX_HEADER_BYTES). Invalid input raises ValueError.
+    """
+
+    def __init__(self, validate: bool = True, normalize: bool = True, max_bytes: Optional[int] = MAX_SIZE_BYTES):
+        self.validate = validate
+        self.normalize = normalize
+        self.max_bytes = max_bytes
+        self.columns: Optional[List[str]] = None
+        self.size = 0
+        self.rows = 0
+        self._sha = hashlib.sha256()
+        self._header = b""
+        self._last = b"\n"
+
+    @property
+    def digest(self) -> str:
+        """SHA-256 of the output, i.e. of the stored file"""
+        return self._sha.hexdigest()
+
+    def feed(self, chunk: bytes) -> bytes:
+        self.size += len(chunk)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise ValueError(f"File too large. Limit {self.max_bytes} bytes.")
+        out = b""
+        if self.columns is None:
+            self._header += chunk
+            end = self._header.find(b"\n")
+            if (end < 0 and len(self._header) > MAX_HEADER_BYTES) or end > MAX_HEADER_BYTES:
+                raise ValueError(f"Unable to read CSV: no header line within the first {MAX_HEADER_BYTES} bytes")
+            if end < 0:
+                return b""
+            chunk = self._header[end + 1:]
+            out = self._read_header(self._header[:end + 1])
+        if chunk:
+            self.rows += chunk.count(b"\n")
+            self._last = chunk[-1:]
+        return self._emit(out + chunk)
+
+    def finish(self) -> bytes:
+        if self.columns is None:
+            if not self._header.strip():
+                if self.validate:
+                    raise ValueError("Unable to read CSV: empty file")
+                self.columns = []
+                return self._emit(self._header)
+            return self._emit(self._read_header(self._header))  # header only, no newline
+        if self._last != b"\n":
+            self.rows += 1  # last row without a trailing newline
+        return b""
+
+    def _emit(self, data: bytes) -> bytes:
+        self._sha.update(data)
+        return data
+
+    def _read_header(self, line: bytes) -> bytes:
+        try:
+            columns = next(csv.reader([line.decode("utf-8-sig").rstrip("\r\n")]))
+        except Exception as e:
+            raise ValueError(f"Unable to read CSV: {e}")
+        if self.validate:
+            cols = set(c.strip().lower() for c in columns)
+            if not any(req.issubset(cols) for req in REQUIRED_COL_SETS):
+                raise ValueError("Missing required columns: date_time/date time, open, high, low, close")
+        if not self.normalize:
+            self.columns = columns
+            return line
+        self.columns = normalize_header(columns)
+        text = io.StringIO()
+        csv.writer(text, lineterminator="\n").writerow(self.columns)
+        return text.getvalue().encode("utf-8")
+
+
+async def save_upload(upload, dst_path: str, ingest: CsvIngest, chunk_size: int = 1024 * 1024) -> CsvIngest:
+    """
+    Stream an UploadFile to dst_path through `ingest` without holding it in
+    memory. On ValueError the partial file is removed and the error re-raised.
+    """
+    try:
+        async with aiofiles.open(dst_path, "wb") as dst:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                await dst.write(ingest.feed(chunk))
+            await dst.write(ingest.finish())
+    except BaseException:
+        if os.path.exists(dst_path):
+            os.remove(dst_path)
+        raise
+    return ingest
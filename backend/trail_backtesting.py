@@ -2,10 +2,24 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import datetime
+import io
 import os
+import time
+import json
+import heapq
+import shutil
+import hashlib
+import inspect
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from itertools import product
 from tqdm import tqdm
 
+try:
+    import fcntl
+except ImportError:  # Windows: open files cannot be renamed away, so no pin is needed
+    fcntl = None
+
 
 CONFIG = {
     'starting_balance': 100000,
@@ -22,11 +36,329 @@ CONFIG = {
 }
 
 
-def load_minute_data(filepath):
+_digests = {}
+
+
+def file_digest(filepath, chunk_size=1 << 20):
+    # SHA-256 of the file contents, remembered per (path, size, mtime)
+    stat = os.stat(filepath)
+    key = (os.path.realpath(filepath), stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        h = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                h.update(chunk)
+        _digests[key] = h.hexdigest()
+    return _digests[key]
+
+
+def _npy_header(dtype, rows):
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {
+        'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        'fortran_order': False,
+        'shape': (rows,),
+    })
+    return header.getvalue()
+
+
+def _prepare_chunk(chunk):
+    # Same cleanup load_minute_data applies to a fully parsed file
+    chunk = chunk.rename(columns={'date_time': 'datetime'})
+    chunk['datetime'] = chunk['datetime'].dt.tz_localize(None)  # Optional: remove timezone info
+    return chunk
+
+
+class ColumnStoreWriter:
+    """Builds a ColumnStore folder from DataFrame chunks.
+
+    Each column is streamed straight into its own .npy file, so only one
+    chunk is held in memory. Datetimes become int64 nanoseconds and text
+    columns categorical codes. Numeric dtypes are widened if a later chunk
+    needs it (e.g. ints followed by floats). Rows are put in datetime order
+    on close() if the chunks did not arrive sorted. The folder is built
+    under a unique temporary name and renamed into place, so concurrent
+    builds of the same store (threads or processes) do not collide.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        parent, name = os.path.split(os.path.abspath(folder))
+        os.makedirs(parent, exist_ok=True)
+        self.tmp = tempfile.mkdtemp(prefix=f"{name}.tmp-", dir=parent)
+        self.rows = 0
+        self.columns = {}
+        self.files = {}
+        self.sorted = True
+        self.last_time = None
+
+    def _path(self, name):
+        return os.path.join(self.tmp, f"{name}.npy")
+
+    def _add_column(self, name, kind, dtype):
+        self.columns[name] = {'name': name, 'kind': kind, 'dtype': np.dtype(dtype)}
+        if kind == 'category':
+            self.columns[name]['categories'] = {}
+        f = open(self._path(name), 'wb')
+        f.write(_npy_header(dtype, 0))
+        self.files[name] = f
+
+    def _widen(self, name, dtype):
+        # Rewrite the rows written so far with the wider dtype
+        col = self.columns[name]
+        self.files[name].close()
+        old = np.fromfile(self._path(name), dtype=col['dtype'], offset=len(_npy_header(col['dtype'], 0)))
+        col['dtype'] = np.dtype(dtype)
+        f = open(self._path(name), 'wb')
+        f.write(_npy_header(dtype, 0))
+        f.write(old.astype(dtype).tobytes())
+        self.files[name] = f
+
+    def append(self, chunk):
+        if 'datetime' in chunk:
+            times = chunk['datetime'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+            if len(times):
+                if not chunk['datetime'].is_monotonic_increasing or (
+                        self.last_time is not None and times[0] < self.last_time):
+                    self.sorted = False
+                self.last_time = times[-1]
+
+        for name in chunk.columns:
+            col = chunk[name]
+            if pd.api.types.is_datetime64_any_dtype(col):
+                kind, values = 'datetime', col.to_numpy(dtype='datetime64[ns]').view(np.int64)
+            elif pd.api.types.is_numeric_dtype(col) or pd.api.types.is_bool_dtype(col):
+                kind, values = 'numeric', col.to_numpy()
+            else:
+                kind, values = 'category', None
+
+            if name not in self.columns:
+                self._add_column(name, kind, np.int32 if kind == 'category' else values.dtype)
+            meta = self.columns[name]
+            if meta['kind'] != kind:
+                raise ValueError(f"Column {name!r} changes type between chunks")
+
+            if meta['kind'] == 'category':
+                categories = meta['categories']
+                codes = np.full(len(col), -1, dtype=np.int32)
+                present = col.notna().to_numpy()
+                for value in pd.unique(col[present]):
+                    categories.setdefault(value, len(categories))
+                codes[present] = col[present].map(categories).to_numpy(dtype=np.int32)
+                values = codes
+            elif values.dtype != meta['dtype']:
+                wider = np.result_type(meta['dtype'], values.dtype)
+                if wider != meta['dtype']:
+                    self._widen(name, wider)
+                values = values.astype(meta['dtype'])
+
+            self.files[name].write(np.ascontiguousarray(values).tobytes())
+        self.rows += len(chunk)
+
+    def close(self):
+        for name, f in self.files.items():
+            f.seek(0)
+            header = _npy_header(self.columns[name]['dtype'], self.rows)
+            assert len(header) == len(_npy_header(self.columns[name]['dtype'], 0))
+            f.write(header)
+            f.close()
+
+        if not self.sorted:
+            # Stable datetime order with NaT last, one column in memory at a time
+            times = np.load(self._path('datetime'), mmap_mode='r')
+            key = np.where(times == np.iinfo(np.int64).min, np.iinfo(np.int64).max, times)
+            order = np.argsort(key, kind='stable')
+            del times, key
+            for name in self.columns:
+                values = np.load(self._path(name))[order]
+                np.save(self._path(name), values)
+
+        meta = {'rows': self.rows, 'columns': []}
+        for col in self.columns.values():
+            entry = {'name': col['name'], 'kind': col['kind']}
+            if col['kind'] == 'category':
+                entry['categories'] = list(col['categories'])
+            meta['columns'].append(entry)
+        with open(os.path.join(self.tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f, default=str)
+        try:
+            os.rename(self.tmp, self.folder)
+        except OSError:
+            shutil.rmtree(self.tmp, ignore_errors=True)  # another process built it first
+        return ColumnStore(self.folder)
+
+
+def _pin_store(folder):
+    """Open a store's meta.json under a shared lock, held while it is in use.
+
+    evict_column_stores skips stores it cannot lock exclusively, so a store
+    is never deleted under a reader that still opens columns by path. Raises
+    FileNotFoundError if the store was evicted before the lock was taken.
+    """
+    path = os.path.join(folder, 'meta.json')
+    f = open(path, 'rb')
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_SH)
+        if os.fstat(f.fileno()).st_ino != os.stat(path).st_ino:
+            f.close()
+            raise FileNotFoundError(path)
+    return f
+
+
+class ColumnStore:
+    """Read-only, memory-mapped OHLCV store: one .npy file per column.
+
+    Columns are ordered by ``datetime`` (int64 ns), which serves as the
+    index for time range lookups. Derived series such as the EMA and
+    signals are saved next to the source columns and mapped the same way,
+    so the pipeline reads everything zero-copy and peak memory does not
+    grow with the length of the history. An open store is pinned against
+    eviction until close() (or garbage collection).
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._pin = _pin_store(folder)
+        self.meta = json.load(self._pin)
+        self.columns = [col['name'] for col in self.meta['columns']]
+
+    def close(self):
+        # Unpin; memory maps already handed out stay valid
+        self._pin.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def __contains__(self, name):
+        return os.path.exists(os.path.join(self.folder, f"{name}.npy"))
+
+    def __getitem__(self, name):
+        return np.load(os.path.join(self.folder, f"{name}.npy"), mmap_mode='r')
+
+    def _tmp_path(self, name):
+        # Unique per call: two threads may build the same column at once
+        fd, tmp = tempfile.mkstemp(prefix=f"{name}.npy.tmp-", dir=self.folder)
+        os.close(fd)
+        return tmp
+
+    def save(self, name, values):
+        # Derived column; written aside and renamed so readers never see a partial file
+        tmp = self._tmp_path(name)
+        with open(tmp, 'wb') as f:
+            np.save(f, values)
+        os.replace(tmp, os.path.join(self.folder, f"{name}.npy"))
+
+    def create(self, name, dtype):
+        # Derived column to be filled in place, chunk by chunk
+        return np.lib.format.open_memmap(self._tmp_path(name), mode='w+', dtype=dtype, shape=(len(self),))
+
+    def commit(self, name, values):
+        values.flush()
+        os.replace(values.filename, os.path.join(self.folder, f"{name}.npy"))
+
+    def frame(self, start=0, stop=None):
+        columns = {}
+        for col in self.meta['columns']:
+            values = np.array(self[col['name']][start:stop])
+            if col['kind'] == 'datetime':
+                values = values.view('datetime64[ns]')
+            elif col['kind'] == 'category':
+                values = pd.Categorical.from_codes(values, categories=col['categories']).astype(object)
+            columns[col['name']] = values
+        return pd.DataFrame(columns, columns=self.columns)
+
+
+def build_column_store(filepath, folder, chunksize=500_000):
+    # Stream the CSV into a ColumnStore without loading the whole file
+    writer = ColumnStoreWriter(folder)
+    for chunk in pd.read_csv(filepath, parse_dates=['date_time'], chunksize=chunksize):
+        writer.append(_prepare_chunk(chunk))
+    return writer.close()
+
+
+def open_column_store(filepath, cache_dir, chunksize=500_000, max_bytes=None):
+    # Stores are kept per content hash. Opening one refreshes its folder's
+    # mtime; with max_bytes, building a new one evicts the least recently
+    # opened others beyond that budget.
+    folder = os.path.join(cache_dir, file_digest(filepath))
+    while True:
+        if not os.path.exists(os.path.join(folder, 'meta.json')):
+            os.makedirs(cache_dir, exist_ok=True)
+            store = build_column_store(filepath, folder, chunksize)
+            if max_bytes is not None:
+                evict_column_stores(cache_dir, max_bytes, keep=folder)
+            return store
+        try:
+            store = ColumnStore(folder)
+        except FileNotFoundError:
+            continue  # evicted just now; build it again
+        os.utime(folder)
+        return store
+
+
+def evict_column_stores(cache_dir, max_bytes, keep=None):
+    """Delete the least recently opened ColumnStores in cache_dir until they
+    fit in max_bytes; ``keep`` and stores held open by a ColumnStore (in any
+    process) are never deleted. Returns the number deleted.
+
+    A store is first renamed out of the way, so it disappears at once rather
+    than file by file.
+    """
+    stores = []
+    for entry in os.scandir(cache_dir):
+        try:
+            if not entry.is_dir() or not os.path.exists(os.path.join(entry.path, 'meta.json')):
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            stores.append((entry.stat().st_mtime_ns, size, entry.path))
+        except OSError:
+            continue  # evicted or replaced meanwhile
+
+    keep = os.path.abspath(keep) if keep else None
+    total = 0
+    evicted = 0
+    for _, size, path in sorted(stores, reverse=True):
+        total += size
+        if total <= max_bytes or os.path.abspath(path) == keep:
+            continue
+        try:
+            lock = open(os.path.join(path, 'meta.json'), 'rb')
+        except OSError:
+            continue
+        with lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # in use
+            trash = tempfile.mkdtemp(prefix=f"{os.path.basename(path)}.evicted-", dir=cache_dir)
+            try:
+                os.rename(path, os.path.join(trash, 'store'))
+                evicted += 1
+            except OSError:
+                pass
+        shutil.rmtree(trash, ignore_errors=True)
+    return evicted
+
+
+def load_minute_data(filepath, cache_dir=None):
+    # With cache_dir, the parsed data is kept in a ColumnStore keyed by the
+    # file's content hash and later loads of the same file skip the CSV parser.
+    if cache_dir:
+        return open_column_store(filepath, cache_dir).frame()
+
     data = pd.read_csv(filepath, parse_dates=['date_time'])
     data.rename(columns={'date_time': 'datetime'}, inplace=True)
     data['datetime'] = data['datetime'].dt.tz_localize(None)  # Optional: remove timezone info
-    data.sort_values('datetime', inplace=True)
+    # Stable, like the ColumnStore: rows sharing a timestamp keep file order
+    data.sort_values('datetime', inplace=True, kind='stable')
+    data.reset_index(drop=True, inplace=True)
     return data
 
 
@@ -34,7 +366,83 @@ def calculate_ema(data, span=9):
     data['ema9'] = data['close'].ewm(span=span, adjust=False).mean()
     return data
 
+
+def ewm_array(values, carry=None, **ewm):
+    """Exponential average (``ewm(**ewm, adjust=False)``) of one chunk,
+    continuing from a previous chunk's carry.
+
+    Matches the pandas result over the concatenated data exactly: the chunk
+    is prefixed with the average at the last observed value and the NaNs
+    that followed it, which restores the pandas recursion state. Returns
+    (average, carry).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    prefix = np.zeros(0) if carry is None else np.concatenate(([carry['ema']], np.full(carry['gap'], np.nan)))
+    series = pd.Series(np.concatenate([prefix, values]))
+    ema = series.ewm(adjust=False, **ewm).mean().to_numpy()[len(prefix):]
+
+    observed = np.flatnonzero(~np.isnan(values))
+    if len(observed):
+        carry = {'ema': float(ema[observed[-1]]), 'gap': int(len(values) - 1 - observed[-1])}
+    elif carry is not None:
+        carry = {'ema': carry['ema'], 'gap': carry['gap'] + len(values)}
+    return ema, carry
+
+
+def ema_array(close, span=9, carry=None):
+    # EMA of one chunk of closes, see ewm_array
+    return ewm_array(close, carry, span=span)
+
+def signal_flags(open_, close, ema):
+    # Per-bar candle flags: red candle closing below EMA / green candle closing above EMA
+    down = (close < open_) & (close < ema)
+    up = (close > open_) & (close > ema)
+    return down, up
+
+
+def detect_signals_array(open_, close, ema, carry=None):
+    """Vectorized 3-bar setup detection over one chunk of bars.
+
+    ``carry`` holds the down/up flags of up to 3 bars preceding the chunk
+    (as returned by a previous call), so consecutive chunks produce the same
+    signals as one call over the concatenated data. Returns (signal, carry).
+    """
+    open_ = np.asarray(open_, dtype=float)
+    close = np.asarray(close, dtype=float)
+    ema = np.asarray(ema, dtype=float)
+    down, up = signal_flags(open_, close, ema)
+
+    if carry is None:
+        carry = {'down': np.zeros(0, dtype=bool), 'up': np.zeros(0, dtype=bool)}
+    k = len(carry['down'])
+    all_down = np.concatenate([carry['down'], down])
+    all_up = np.concatenate([carry['up'], up])
+
+    # Bar j (in the carried frame) needs the 3 bars j-3..j-1 to all match
+    n = len(close)
+    last3_down = np.zeros(n, dtype=bool)
+    last3_up = np.zeros(n, dtype=bool)
+    first = max(3 - k, 0)
+    if first < n:
+        j = np.arange(first + k, n + k)
+        last3_down[first:] = all_down[j - 3] & all_down[j - 2] & all_down[j - 1]
+        last3_up[first:] = all_up[j - 3] & all_up[j - 2] & all_up[j - 1]
+
+    signal = np.zeros(n, dtype=np.int64)
+    signal[last3_down & (close > ema)] = 1
+    signal[last3_up & (close < ema)] = -1
+
+    carry = {'down': all_down[-3:].copy(), 'up': all_up[-3:].copy()}
+    return signal, carry
+
+
 def detect_signals(data):
+    signal, _ = detect_signals_array(data['open'].to_numpy(), data['close'].to_numpy(), data['ema9'].to_numpy())
+    data['signal'] = signal  # 1 for long, -1 for short
+    return data
+
+def detect_signals_loop(data):
+    # Reference implementation kept as an oracle for detect_signals
     data['signal'] = 0  # 1 for long, -1 for short
     
     for i in range(3, len(data)):
@@ -56,7 +464,610 @@ def detect_signals(data):
 
     return data
 
-def simulate_trades(data, config):
+# Indicator registry. Each indicator takes a data source (DataFrame, arrays
+# dict or ColumnStore), the output array to fill with one float64 value per
+# bar and keyword params. get_indicator memoizes the result as a column of
+# the source itself, so within one dataset every (indicator, params) series
+# is computed once; for a ColumnStore the column is written on disk next to
+# the data.
+
+INDICATORS = {}
+
+
+def indicator(name):
+    def register(fn):
+        INDICATORS[name] = fn
+        return fn
+    return register
+
+
+def _registered_params(registry, kind, name, params):
+    # Explicit params merged over the registered function's defaults
+    if name not in registry:
+        raise ValueError(f"Unknown {kind} '{name}', expected one of {sorted(registry)}")
+    signature = inspect.signature(registry[name])
+    defaults = {k: p.default for k, p in signature.parameters.items() if p.default is not inspect.Parameter.empty}
+    return {**defaults, **params}
+
+
+def _registered_column(registry, kind, name, params):
+    # e.g. ema_span9; params left at None are not part of the name
+    params = _registered_params(registry, kind, name, params)
+    return '_'.join([name] + [f"{k}{v}" for k, v in sorted(params.items()) if v is not None])
+
+
+# Bars per block when a derived column is computed: every indicator and
+# strategy fills its output block by block, so for a ColumnStore neither
+# the inputs nor the result are ever held in memory whole
+CHUNK_BARS = 1_000_000
+
+
+def _memoized(source, column, dtype, compute):
+    # compute(out) fills one value per bar; for a ColumnStore out is the
+    # memory-mapped file of the new column
+    if column not in source:
+        if isinstance(source, ColumnStore):
+            out = source.create(column, dtype)
+            compute(out)
+            source.commit(column, out)
+        else:
+            out = np.empty(len(source['close']), dtype=dtype)
+            compute(out)
+            source[column] = out
+    return source[column]
+
+
+def indicator_params(name, **params):
+    return _registered_params(INDICATORS, 'indicator', name, params)
+
+
+def indicator_column(name, **params):
+    return _registered_column(INDICATORS, 'indicator', name, params)
+
+
+def get_indicator(source, name, **params):
+    return _memoized(source, indicator_column(name, **params), np.float64,
+                     lambda out: INDICATORS[name](source, out, **indicator_params(name, **params)))
+
+
+def _blocks(n):
+    return [(i, min(i + CHUNK_BARS, n)) for i in range(0, n, CHUNK_BARS)]
+
+
+def _column(source, name):
+    # Column as stored (memory-mapped for a ColumnStore), sliced per block
+    if name not in source:
+        raise ValueError(f"Indicator needs a '{name}' column")
+    values = source[name]
+    return values.to_numpy() if isinstance(values, pd.Series) else values
+
+
+def _floats(column, i, j):
+    return np.asarray(column[i:j], dtype=np.float64)
+
+
+def _previous(column, i, j):
+    # Values of bars i-1 .. j-2, NaN before the first bar
+    if i:
+        return _floats(column, i - 1, j - 1)
+    return np.concatenate(([np.nan], _floats(column, 0, j - 1)))
+
+
+def _nanoseconds(times):
+    times = np.asarray(times)
+    return times.astype('datetime64[ns]').view(np.int64) if times.dtype.kind == 'M' else times
+
+
+def _wilder(values, span, carry=None):
+    # Wilder's smoothing (RMA), as used by ATR and RSI
+    return ewm_array(values, carry, alpha=1 / span)
+
+
+def _day_sum(sums, day):
+    # Running sum of the last day in a groupby cumsum, NaN rows skipped
+    valid = np.flatnonzero((day == day[-1]) & ~np.isnan(sums))
+    return sums[valid[-1]] if len(valid) else 0.0
+
+
+@indicator('ema')
+def ema_indicator(source, out, span=9):
+    close = _column(source, 'close')
+    carry = None
+    for i, j in _blocks(len(out)):
+        out[i:j], carry = ema_array(close[i:j], span, carry)
+    return out
+
+
+@indicator('sma')
+def sma_indicator(source, out, span=9):
+    close = _column(source, 'close')
+    for i, j in _blocks(len(out)):
+        k = max(i - span + 1, 0)  # the window reaches back into the previous block
+        out[i:j] = pd.Series(_floats(close, k, j)).rolling(span).mean().to_numpy()[i - k:]
+    return out
+
+
+@indicator('atr')
+def atr_indicator(source, out, span=14):
+    high, low, close = _column(source, 'high'), _column(source, 'low'), _column(source, 'close')
+    carry = None
+    for i, j in _blocks(len(out)):
+        h, l, prev = _floats(high, i, j), _floats(low, i, j), _previous(close, i, j)
+        true_range = np.fmax(h - l, np.fmax(np.abs(h - prev), np.abs(l - prev)))
+        out[i:j], carry = _wilder(true_range, span, carry)
+    return out
+
+
+@indicator('rsi')
+def rsi_indicator(source, out, span=14):
+    close = _column(source, 'close')
+    gain_carry = loss_carry = None
+    for i, j in _blocks(len(out)):
+        delta = _floats(close, i, j) - _previous(close, i, j)
+        gain, gain_carry = _wilder(np.where(delta > 0, delta, np.where(np.isnan(delta), np.nan, 0.0)), span, gain_carry)
+        loss, loss_carry = _wilder(np.where(delta < 0, -delta, np.where(np.isnan(delta), np.nan, 0.0)), span, loss_carry)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100 - 100 / (1 + gain / loss)
+        out[i:j] = np.where((loss == 0) & (gain > 0), 100.0, rsi)
+    return out
+
+
+@indicator('vwap')
+def vwap_indicator(source, out, span=None):
+    # Rolling VWAP over `span` bars, or anchored to each calendar day when None
+    high, low, close, volume = (_column(source, c) for c in ('high', 'low', 'close', 'volume'))
+    times = _column(source, 'datetime') if span is None else None
+    carry = None  # (day, pv sum, volume sum) of the day in progress
+    for i, j in _blocks(len(out)):
+        k = i if span is None else max(i - span + 1, 0)
+        vol = _floats(volume, k, j)
+        pv = (_floats(high, k, j) + _floats(low, k, j) + _floats(close, k, j)) / 3 * vol
+        if span is None:
+            day = _nanoseconds(times[i:j]) // 86_400_000_000_000
+            if carry is not None:
+                # Leading row holding the sums so far of the day in progress
+                day, pv, vol = (np.concatenate(([c], v)) for c, v in zip(carry, (day, pv, vol)))
+                k -= 1
+            pv = pd.Series(pv).groupby(day).cumsum().to_numpy()
+            vol = pd.Series(vol).groupby(day).cumsum().to_numpy()
+            carry = (day[-1], _day_sum(pv, day), _day_sum(vol, day))
+        else:
+            pv = pd.Series(pv).rolling(span).sum().to_numpy()
+            vol = pd.Series(vol).rolling(span).sum().to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[i:j] = (pv / vol)[i - k:]
+    return out
+
+
+# Strategy registry. A strategy turns a data source into the per-bar entry
+# signal the simulation consumes (1 long, -1 short, 0 none); exits are the
+# shared TP/SL/trailing rules of the config. get_signals memoizes the signal
+# as a 'signal_<strategy>_<params>' column like get_indicator does.
+
+STRATEGIES = {}
+
+
+def strategy(name, title=None):
+    def register(fn):
+        fn.title = title or name
+        STRATEGIES[name] = fn
+        return fn
+    return register
+
+
+def strategy_params(name, **params):
+    return _registered_params(STRATEGIES, 'strategy', name, params)
+
+
+def strategy_key(name, **params):
+    return _registered_column(STRATEGIES, 'strategy', name, params)
+
+
+def get_signals(source, name, **params):
+    return _memoized(source, f"signal_{strategy_key(name, **params)}", np.int64,
+                     lambda out: STRATEGIES[name](source, out, **strategy_params(name, **params)))
+
+
+def _crossings(fast, slow):
+    # +1 where fast crosses above slow, -1 where it crosses below
+    above = fast > slow
+    below = fast < slow
+    signal = np.zeros(len(fast), dtype=np.int64)
+    signal[1:][above[1:] & ~above[:-1]] = 1
+    signal[1:][below[1:] & ~below[:-1]] = -1
+    return signal
+
+
+@strategy('ema_crossover', title='EMA Crossover Strategy')
+def ema_crossover_signals(source, out, span=9):
+    # Three candles closing on one side of the EMA, then a close back across it
+    open_, close = _column(source, 'open'), _column(source, 'close')
+    ema = np.asarray(get_indicator(source, 'ema', span=span))
+    carry = None
+    for i, j in _blocks(len(out)):
+        out[i:j], carry = detect_signals_array(open_[i:j], close[i:j], ema[i:j], carry)
+    return out
+
+
+@strategy('sma_cross', title='SMA Crossover Strategy')
+def sma_cross_signals(source, out, fast=10, slow=30):
+    fast = np.asarray(get_indicator(source, 'sma', span=fast))
+    slow = np.asarray(get_indicator(source, 'sma', span=slow))
+    for i, j in _blocks(len(out)):
+        k = max(i - 1, 0)  # a crossing is relative to the bar before
+        out[i:j] = _crossings(_floats(fast, k, j), _floats(slow, k, j))[i - k:]
+    return out
+
+
+@strategy('rsi_reversion', title='RSI Mean Reversion Strategy')
+def rsi_reversion_signals(source, out, span=14, lower=30, upper=70):
+    # Long when RSI recovers above `lower`, short when it falls back below `upper`
+    rsi = np.asarray(get_indicator(source, 'rsi', span=span))
+    for i, j in _blocks(len(out)):
+        k = max(i - 1, 0)
+        block = _floats(rsi, k, j)
+        signal = np.where(_crossings(block, np.full(len(block), lower)) == 1, 1, 0)
+        signal[_crossings(block, np.full(len(block), upper)) == -1] = -1
+        out[i:j] = signal[i - k:]
+    return out
+
+
+# One row per closed trade; times are int64 nanoseconds, side is 1 long / -1 short,
+# outcome is 1 for TP and 0 for SL.
+FILL_DTYPE = np.dtype([
+    ('entry_idx', np.int64),
+    ('exit_idx', np.int64),
+    ('entry_time', np.int64),
+    ('exit_time', np.int64),
+    ('side', np.int8),
+    ('entry_price', np.float64),
+    ('exit_price', np.float64),
+    ('quantity', np.int64),
+    ('pnl', np.float64),
+    ('outcome', np.int8),
+    ('balance', np.float64),
+])
+
+TRADE_COLUMNS = [
+    'Entry Time', 'Exit Time', 'Type', 'Entry Price', 'Exit Price',
+    'Quantity', 'PNL', 'Outcome', 'Balance After Trade',
+]
+
+
+def market_arrays(data):
+    # Contiguous column arrays for the simulation core
+    return {
+        'datetime': np.ascontiguousarray(data['datetime'].to_numpy(dtype='datetime64[ns]').view(np.int64)),
+        'open': np.ascontiguousarray(data['open'].to_numpy(dtype=np.float64)),
+        'high': np.ascontiguousarray(data['high'].to_numpy(dtype=np.float64)),
+        'low': np.ascontiguousarray(data['low'].to_numpy(dtype=np.float64)),
+        'close': np.ascontiguousarray(data['close'].to_numpy(dtype=np.float64)),
+        'signal': np.ascontiguousarray(data['signal'].to_numpy(dtype=np.int64)),
+    }
+
+
+def exit_offsets(configs):
+    # Per-config price offsets used by find_exits
+    return {
+        'tp': np.array([c['tp_ticks'] * c['tick_size'] for c in configs], dtype=np.float64),
+        'sl': np.array([c['sl_ticks'] * c['tick_size'] for c in configs], dtype=np.float64),
+        'trail': np.array([c['trailing_stop_ticks'] * c['tick_size'] for c in configs], dtype=np.float64),
+        'trailing': np.array([bool(c['trailing_stop']) for c in configs], dtype=bool),
+    }
+
+
+def find_exits(high, low, entry_idx, side, entry_price, offsets, extreme=None):
+    """Scan forward from the bar after ``entry_idx`` for the first TP/SL hit.
+
+    ``offsets`` (see exit_offsets) may hold several parameter sets entered on
+    the same bar; they are checked together, one 2-D comparison per block of
+    bars, with blocks growing as the trade stays open. A trade carried over
+    from a previous chunk passes entry_idx=-1 and its running ``extreme``.
+    Returns (exit_idx, exit_price, outcome, extreme); exit_idx is -1 for a
+    trade still open at the end of the data.
+    """
+    n = len(high)
+    if side == 1:
+        tp_price = entry_price + offsets['tp']
+        sl_price = entry_price - offsets['sl']
+    else:
+        tp_price = entry_price - offsets['tp']
+        sl_price = entry_price + offsets['sl']
+    trail = offsets['trail']
+    trailing = offsets['trailing']
+
+    m = len(tp_price)
+    exit_idx = np.full(m, -1, dtype=np.int64)
+    exit_price = np.full(m, np.nan)
+    outcome = np.zeros(m, dtype=np.int8)
+
+    active = np.arange(m)
+    if extreme is None:
+        extreme = entry_price  # best price seen so far, for the trailing stop
+    pos = entry_idx + 1
+    block = 64
+    while pos < n and len(active):
+        stop = min(pos + block, n)
+        hi = high[pos:stop]
+        lo = low[pos:stop]
+        tp = tp_price[active]
+        sl = sl_price[active]
+
+        if side == 1:
+            if trailing[active].any():
+                # fmax skips NaN bars, as max() did in the per-row loop
+                running = np.fmax.accumulate(np.concatenate(([extreme], hi)))[1:]
+                extreme = running[-1]
+                sl = np.where(trailing[active], np.maximum(sl, running[:, None] - trail[active]), sl)
+            else:
+                sl = np.broadcast_to(sl, (stop - pos, len(active)))
+            hit_tp = hi[:, None] >= tp
+            hit_sl = lo[:, None] <= sl
+        else:
+            if trailing[active].any():
+                running = np.fmin.accumulate(np.concatenate(([extreme], lo)))[1:]
+                extreme = running[-1]
+                sl = np.where(trailing[active], np.minimum(sl, running[:, None] + trail[active]), sl)
+            else:
+                sl = np.broadcast_to(sl, (stop - pos, len(active)))
+            hit_tp = lo[:, None] <= tp
+            hit_sl = hi[:, None] >= sl
+
+        hit = hit_tp | hit_sl
+        closed = hit.any(axis=0)
+        if closed.any():
+            cols = np.flatnonzero(closed)
+            rows = hit[:, cols].argmax(axis=0)
+            took_tp = hit_tp[rows, cols]
+            done = active[cols]
+            exit_idx[done] = pos + rows
+            exit_price[done] = np.where(took_tp, tp[cols], sl[rows, cols])
+            outcome[done] = took_tp
+            active = active[~closed]
+
+        pos = stop
+        block = min(block * 2, 1 << 16)
+
+    return exit_idx, exit_price, outcome, extreme
+
+
+def position_size(balance, config):
+    # Sizing is fixed at one contract; the margin/risk caps are still
+    # evaluated so invalid configs fail the same way as the per-bar loop.
+    max_contracts_margin = balance // config['contract_margin']
+    risk_per_trade = balance * config['risk_percentage']
+    max_contracts_risk = risk_per_trade // (config['sl_ticks'] * config['tick_value'])
+    # qty = min(max_contracts_margin, max_contracts_risk)
+    return 1
+
+
+def close_trade(entry_price, exit_price, side, qty, config):
+    pnl = (exit_price - entry_price) * qty * config['tick_value'] / config['tick_size']
+    if side == -1:
+        pnl = -pnl
+    # Deduct commission and slippage
+    total_cost = config['commission_per_trade'] + config['slippage_ticks'] * config['tick_value'] * 2
+    return pnl - total_cost
+
+
+def signal_entries(signal, start=4, chunksize=1 << 22):
+    # Bars with a nonzero signal from ``start`` on, found block by block
+    parts = [np.flatnonzero(signal[i:i + chunksize]) + i for i in range(start, len(signal), chunksize)]
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+
+class SimulationProgress:
+    """Bars processed, trades closed, throughput and ETA of a simulation.
+
+    ``callback`` receives a snapshot dict at most every ``interval`` seconds
+    and once more on close(); without a callback progress is shown as a
+    tqdm bar on the terminal.
+    """
+
+    def __init__(self, total, callback=None, interval=0.5):
+        self.total = total
+        self.bars = 0
+        self.trades = 0
+        self.callback = callback
+        self.interval = interval
+        self.started = time.monotonic()
+        self._reported = None
+        self._bar = None if callback else tqdm(total=total, desc="Simulating Trades", leave=False)
+
+    def update(self, bars, trades=0):
+        self.bars += bars
+        self.trades += trades
+        if self._bar is not None:
+            self._bar.update(bars)
+        elif self._reported is None or time.monotonic() - self._reported >= self.interval:
+            self.report()
+
+    def snapshot(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.bars / elapsed if elapsed > 0 else 0.0
+        return {
+            'bars': self.bars,
+            'total_bars': self.total,
+            'trades': self.trades,
+            'elapsed': elapsed,
+            'bars_per_sec': rate,
+            'eta': (self.total - self.bars) / rate if rate else None,
+        }
+
+    def report(self):
+        self._reported = time.monotonic()
+        self.callback(self.snapshot())
+
+    def close(self):
+        if self._bar is not None:
+            self._bar.close()
+        else:
+            self.report()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def simulate_chunk(arrays, config, state=None, start=4, progress=None):
+    """Event-driven simulation over prepared arrays (see market_arrays).
+
+    Jumps from one signal bar to the next while flat and locates each exit
+    with find_exits, writing closed trades into a preallocated FILL_DTYPE
+    array. ``state`` carries the bar offset, balance and any open trade from
+    the previous chunk, so a file can be simulated piece by piece; bar
+    indices in the fills are global. Returns (fills, state).
+    """
+    close = arrays['close']
+    signal = arrays['signal']
+    times = arrays['datetime']
+    n = len(close)
+
+    if state is None:
+        state = {'offset': 0, 'balance': config['starting_balance'], 'trade': None}
+    offset = state['offset']
+    balance = state['balance']
+    trade = state['trade']
+
+    entries = signal_entries(signal, max(start - offset, 0))
+    fills = np.zeros(len(entries) + 1, dtype=FILL_DTYPE)
+    if offset + n <= start:
+        return fills[:0], dict(state, offset=offset + n)
+
+    qty = position_size(balance, config)
+    offsets = exit_offsets([config])
+
+    k = 0
+    next_entry = 0
+    done = min(max(start - offset, 0), n)
+    if trade is not None:
+        # Trade carried over from the previous chunk
+        exit_idx, exit_price, outcome, extreme = find_exits(
+            arrays['high'], arrays['low'], -1, trade['side'], trade['entry_price'], offsets, trade['extreme'])
+        x = int(exit_idx[0])
+        if x < 0:
+            entries = entries[:0]
+            trade = dict(trade, extreme=extreme)
+        else:
+            pnl = close_trade(trade['entry_price'], exit_price[0], trade['side'], qty, config)
+            balance += pnl
+            fills[k] = (trade['entry_idx'], offset + x, trade['entry_time'], times[x], trade['side'],
+                        trade['entry_price'], exit_price[0], qty, pnl, outcome[0], balance)
+            k += 1
+            trade = None
+            next_entry = int(np.searchsorted(entries, x))
+            if progress is not None:
+                progress.update(x - done, 1)
+            done = x
+
+    while next_entry < len(entries):
+        e = entries[next_entry]
+        side = 1 if signal[e] == 1 else -1
+        entry_price = close[e]
+        exit_idx, exit_price, outcome, extreme = find_exits(arrays['high'], arrays['low'], e, side, entry_price, offsets)
+        x = int(exit_idx[0])
+        if x < 0:
+            # Still in trade at the end of the data
+            trade = {'entry_idx': offset + e, 'entry_time': times[e], 'side': side,
+                     'entry_price': entry_price, 'extreme': extreme}
+            break
+
+        pnl = close_trade(entry_price, exit_price[0], side, qty, config)
+        balance += pnl
+        fills[k] = (offset + e, offset + x, times[e], times[x], side, entry_price, exit_price[0], qty, pnl, outcome[0], balance)
+        k += 1
+
+        # A new trade can open on the exit bar itself
+        next_entry = int(np.searchsorted(entries, x))
+        if progress is not None:
+            progress.update(x - done, 1)
+        done = x
+
+    if progress is not None:
+        progress.update(n - done)
+    return fills[:k], {'offset': offset + n, 'balance': balance, 'trade': trade}
+
+
+def simulate_arrays(arrays, config, start=4, on_progress=None):
+    # Whole-dataset run; a trade still open at the end is dropped.
+    # on_progress receives SimulationProgress snapshots.
+    with SimulationProgress(max(len(arrays['close']) - start, 0), on_progress) as progress:
+        fills, _ = simulate_chunk(arrays, config, start=start, progress=progress)
+    return fills
+
+
+def simulate_grid(arrays, configs, start=4):
+    """Simulate many parameter sets together in one pass over the bars.
+
+    Parameter sets waiting to enter on the same signal bar share a single
+    find_exits scan; bars are visited in increasing order. Returns one
+    FILL_DTYPE array per config, matching simulate_arrays for each.
+    """
+    close = arrays['close']
+    signal = arrays['signal']
+    times = arrays['datetime']
+    n = len(close)
+
+    trades = [[] for _ in configs]
+    entries = signal_entries(signal, start)
+    if len(entries) and configs:
+        offsets = exit_offsets(configs)
+        balance = [c['starting_balance'] for c in configs]
+        qty = [position_size(c['starting_balance'], c) for c in configs]
+
+        waiting = {int(entries[0]): list(range(len(configs)))}
+        queue = [int(entries[0])]
+        while queue:
+            e = heapq.heappop(queue)
+            members = np.array(waiting.pop(e))
+            side = 1 if signal[e] == 1 else -1
+            entry_price = close[e]
+            group = {key: value[members] for key, value in offsets.items()}
+            exit_idx, exit_price, outcome, _ = find_exits(arrays['high'], arrays['low'], e, side, entry_price, group)
+
+            for p, x, price, out in zip(members.tolist(), exit_idx.tolist(), exit_price, outcome):
+                if x < 0:
+                    continue  # still in trade at the end of the data
+                pnl = close_trade(entry_price, price, side, qty[p], configs[p])
+                balance[p] += pnl
+                trades[p].append((e, x, times[e], times[x], side, entry_price, price, qty[p], pnl, out, balance[p]))
+
+                nxt = int(np.searchsorted(entries, x))
+                if nxt < len(entries):
+                    bar = int(entries[nxt])
+                    if bar not in waiting:
+                        waiting[bar] = []
+                        heapq.heappush(queue, bar)
+                    waiting[bar].append(p)
+
+    return [np.array(t, dtype=FILL_DTYPE) for t in trades]
+
+
+def fills_to_trades(fills):
+    if len(fills) == 0:
+        return pd.DataFrame()
+    return pd.DataFrame({
+        'Entry Time': fills['entry_time'].view('datetime64[ns]'),
+        'Exit Time': fills['exit_time'].view('datetime64[ns]'),
+        'Type': np.where(fills['side'] == 1, 'long', 'short').astype(object),
+        'Entry Price': fills['entry_price'],
+        'Exit Price': fills['exit_price'],
+        'Quantity': fills['quantity'],
+        'PNL': fills['pnl'],
+        'Outcome': np.where(fills['outcome'] == 1, 'TP', 'SL').astype(object),
+        'Balance After Trade': fills['balance'],
+    }, columns=TRADE_COLUMNS)
+
+
+def simulate_trades(data, config, on_progress=None):
+    fills = simulate_arrays(market_arrays(data), config, on_progress=on_progress)
+    return fills_to_trades(fills)
+
+
+def simulate_trades_loop(data, config):
+    # Reference implementation kept as an oracle for simulate_trades
     balance = config['starting_balance']
     open_trade = None
     trades = []
@@ -153,48 +1164,205 @@ def simulate_trades(data, config):
     return trades_df
 
 
+def performance_metrics(pnl, initial_balance=CONFIG['starting_balance']):
+    """Full metric set of one trade sequence, straight from its PnL array.
+
+    One pass over NumPy arrays replaces the DataFrame filters and cumsums of
+    analyze_performance and the API adapter. NaN PnLs are skipped the way
+    pandas skips them, so the values equal the DataFrame versions exactly.
+    Returns {} when there are no trades.
+    """
+    pnl = np.asarray(pnl, dtype=np.float64)
+    n = len(pnl)
+    if not n:
+        return {}
+    missing = np.isnan(pnl)
+    count = n - int(missing.sum())
+    filled = np.where(missing, 0.0, pnl)
+    total = filled.sum()
+
+    # Equity at each exit and its drawdown from the running peak
+    balance = initial_balance + np.cumsum(filled)
+    balance[missing] = np.nan
+    peak = np.maximum.accumulate(np.where(missing, -np.inf, balance))
+    drawdown = np.where(missing, -np.inf, peak - balance)
+
+    # Sharpe from per-trade returns (sample std), annualized per minute
+    returns = np.where(missing, 0.0, pnl / initial_balance)
+    mean_return = returns.sum() / count if count else np.nan
+    if count > 1:
+        squares = (mean_return - returns) ** 2
+        squares[missing] = 0.0
+        std = np.sqrt(squares.sum() / (count - 1))
+    else:
+        std = np.nan
+    sharpe = (mean_return / std) * np.sqrt(252*24*60) if std != 0 else np.nan
+
+    wins = pnl[pnl > 0]
+    losses = pnl[pnl < 0]
+    avg_win = wins.sum() / len(wins) if len(wins) else 0.0
+    avg_loss = losses.sum() / len(losses) if len(losses) else 0.0
+    return {
+        'total_trades': n,
+        'wins': len(wins),
+        'losses': n - len(wins),
+        'win_rate': len(wins) / n,
+        'avg_pnl': total / count if count else np.nan,
+        'total_pnl': total,
+        'profit_percentage': (total / initial_balance) * 100,
+        'avg_win': avg_win,
+        'avg_loss': avg_loss,
+        'risk_reward_ratio': abs(avg_win / avg_loss) if avg_loss != 0 else 0.0,
+        'max_drawdown': drawdown.max() if count else np.nan,
+        'sharpe_ratio': sharpe,
+        'best_trade': pnl[~missing].max() if count else np.nan,
+        'worst_trade': pnl[~missing].min() if count else np.nan,
+    }
+
+
+def batch_performance_metrics(pnls, initial_balance=CONFIG['starting_balance']):
+    # performance_metrics for many trade sets (e.g. one per grid cell)
+    return [performance_metrics(pnl, initial_balance) for pnl in pnls]
+
+
+def _analysis(metrics):
+    # analyze_performance's naming of a performance_metrics result
+    if not metrics:
+        return {}
+    return {
+        'Total Trades': metrics['total_trades'],
+        'Win Rate': metrics['win_rate'],
+        'Average Profit per Trade': metrics['avg_pnl'],
+        'Total Profit': metrics['total_pnl'],
+        'Profit Percentage': metrics['profit_percentage'],
+        'Max Drawdown': metrics['max_drawdown'],
+        'Sharpe Ratio': metrics['sharpe_ratio']
+    }
+
+
 def analyze_performance(trades_df, initial_balance=CONFIG['starting_balance']):
     if trades_df.empty:
         return {}
+    return _analysis(performance_metrics(trades_df['PNL'].to_numpy(dtype=np.float64), initial_balance))
+
 
-    # Calculate win rate
-    win_rate = (trades_df['PNL'] > 0).mean()
+def _equity_block(close, fills, config, i, j):
+    # equity_curve for bars i .. j-1
+    bars = np.arange(i, j)
+    if not len(fills):
+        return np.full(j - i, float(config['starting_balance']))
 
-    # Total trades
-    total_trades = len(trades_df)
+    # Trades never overlap, so one lookup per bar finds the last exit and
+    # the last entry
+    closed = np.searchsorted(fills['exit_idx'], bars, 'right') - 1
+    equity = np.where(closed >= 0, fills['balance'][np.maximum(closed, 0)], float(config['starting_balance']))
+    t = np.searchsorted(fills['entry_idx'], bars, 'right') - 1
+    held = (t >= 0) & (bars < fills['exit_idx'][np.maximum(t, 0)])
+    t = t[held]
+    equity[held] += ((_floats(close, i, j)[held] - fills['entry_price'][t]) * fills['side'][t] * fills['quantity'][t]
+                     * config['tick_value'] / config['tick_size'])
+    return equity
 
-    # Average profit per trade
-    avg_profit = trades_df['PNL'].mean()
 
-    # Total profit
-    total_profit = trades_df['PNL'].sum()
+def equity_blocks(arrays, fills, config):
+    # (times, equity) of equity_curve, CHUNK_BARS bars at a time
+    for i, j in _blocks(len(arrays['close'])):
+        yield _nanoseconds(arrays['datetime'][i:j]), _equity_block(arrays['close'], fills, config, i, j)
 
-    # Profit percentage (based on starting balance)
-    profit_percentage = (total_profit / initial_balance) * 100
 
-    # Cumulative performance
-    trades_df['cumulative_pnl'] = trades_df['PNL'].cumsum()
-    trades_df['cumulative_balance'] = initial_balance + trades_df['cumulative_pnl']
+def equity_curve(arrays, fills, config):
+    """Mark-to-market balance at every bar close.
 
-    # Max drawdown
-    max_drawdown = (trades_df['cumulative_balance'].cummax() - trades_df['cumulative_balance']).max()
+    Realized balance after the last exit at or before each bar, plus the
+    open trade valued at the bar's close; commission and slippage are
+    booked at the exit, as in the fills. ``fills`` must come from a run over
+    the same ``arrays`` (global bar indices); a trade still open at the end
+    of the data is not part of the fills and so not marked. For long
+    histories, equity_curve_metrics works through equity_blocks instead.
+    """
+    n = len(arrays['close'])
+    return np.concatenate([equity for _, equity in equity_blocks(arrays, fills, config)] or [np.zeros(n)])
 
-    # Returns (to calculate Sharpe ratio)
-    returns = trades_df['PNL'] / initial_balance
 
-    # Sharpe ratio
-    sharpe_ratio = (returns.mean() / returns.std()) * np.sqrt(252*24*60) if returns.std() != 0 else np.nan
+def resample_equity(times, equity, freq='D'):
+    # Last value in each fixed-length period (e.g. 'min', 'h', 'D');
+    # returns (period start times, values). freq=None keeps every bar.
+    times = np.asarray(times)
+    if freq is None or not len(times):
+        return times, equity
+    step = pd.tseries.frequencies.to_offset(freq).nanos
+    period = times // step
+    last = np.flatnonzero(np.append(period[1:] != period[:-1], True))
+    return period[last] * step, equity[last]
+
+
+def _equity_stats(blocks, freq='D', periods_per_year=None):
+    # equity_metrics over (times, equity) blocks in time order. Only the
+    # sampled points are kept; the running peak and the last sampled
+    # period are carried from block to block.
+    sampled_times, sampled = [], []
+    peak = np.nan
+    max_drawdown = max_drawdown_pct = np.nan
+    for times, equity in blocks:
+        block_times, block_values = resample_equity(times, equity, freq)
+        if freq is not None and len(block_times) and sampled_times and sampled_times[-1][-1] == block_times[0]:
+            # The previous block ended inside this period
+            sampled_times[-1] = sampled_times[-1][:-1]
+            sampled[-1] = sampled[-1][:-1]
+        sampled_times.append(np.array(block_times))
+        sampled.append(np.array(block_values, dtype=np.float64))
+
+        if len(equity) and not np.isnan(equity).all():
+            running = np.fmax.accumulate(np.concatenate(([peak], equity)))[1:]
+            peak = running[-1]
+            drawdown = running - equity
+            max_drawdown = np.fmax(max_drawdown, np.nanmax(drawdown))
+            max_drawdown_pct = np.fmax(max_drawdown_pct, np.nanmax(drawdown / running))
+
+    sampled_times = np.concatenate(sampled_times) if sampled_times else np.zeros(0, dtype=np.int64)
+    sampled = np.concatenate(sampled) if sampled else np.zeros(0)
+    returns = sampled[1:] / sampled[:-1] - 1
+    returns = returns[np.isfinite(returns)]
+    if periods_per_year is None and len(returns):
+        years = (sampled_times[-1] - sampled_times[0]) / pd.Timedelta(days=365.25).value
+        periods_per_year = len(returns) / years if years > 0 else np.nan
+
+    sharpe = sortino = np.nan
+    if len(returns) > 1:
+        scale = np.sqrt(periods_per_year)
+        std = returns.std(ddof=1)
+        downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
+        sharpe = returns.mean() / std * scale if std > 0 else np.nan
+        sortino = returns.mean() / downside * scale if downside > 0 else np.nan
 
     return {
-        'Total Trades': total_trades,
-        'Win Rate': win_rate,
-        'Average Profit per Trade': avg_profit,
-        'Total Profit': total_profit,
-        'Profit Percentage': profit_percentage,
-        'Max Drawdown': max_drawdown,
-        'Sharpe Ratio': sharpe_ratio
+        'periods': len(returns),
+        'sharpe_ratio': sharpe,
+        'sortino_ratio': sortino,
+        'max_drawdown': max_drawdown,
+        'max_drawdown_pct': max_drawdown_pct,
     }
 
+
+def equity_metrics(times, equity, freq='D', periods_per_year=None):
+    """Sharpe, Sortino and drawdown of an equity series (see equity_curve).
+
+    Returns are the period-over-period changes of the equity sampled every
+    ``freq``; they are annualized with ``periods_per_year`` or, by default,
+    with the number of periods the data actually has per year (so weekends
+    and session gaps do not count). Drawdown is measured on the unsampled
+    series, in money and as a fraction of the running peak.
+    """
+    times = np.asarray(times)
+    blocks = ((times[i:j], equity[i:j]) for i, j in _blocks(len(times)))
+    return _equity_stats(blocks, freq, periods_per_year)
+
+
+def equity_curve_metrics(arrays, fills, config, freq='D', periods_per_year=None):
+    # equity_metrics of equity_curve, computed block by block so memory does
+    # not grow with the length of the history
+    return _equity_stats(equity_blocks(arrays, fills, config), freq, periods_per_year)
+
 def save_trades(trades_df, path='trades.csv'):
     trades_df.to_csv(path, index=False)
 
@@ -203,119 +1371,347 @@ def save_metrics(metrics, path='metrics.csv'):
     df.to_csv(path, index=False)
 
 
-def plot_trades(data, trades_df, output_folder='plots', months_per_plot=3):
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-    
-    start_date = data['datetime'].min()
-    end_date = data['datetime'].max()
-    
+# Candle timeframes tried, finest first, to fit a chart's point budget
+CANDLE_TIMEFRAMES = ['1min', '5min', '15min', '30min', '1h', '4h', '1D', '7D']
+
+
+def lttb(x, y, max_points):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps.
+
+    The first and last points are always kept; in between, each of
+    max_points - 2 equal buckets contributes the point forming the largest
+    triangle with the previously kept point and the next bucket's average,
+    which preserves peaks and troughs (and so drawdowns) of the curve.
+    """
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    if max_points < 3:
+        return np.array([0, n - 1])[:max(max_points, 0)]
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    edges = (np.arange(max_points - 1) * ((n - 2) / (max_points - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    keep = np.empty(max_points, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx = x[nxt_lo:nxt_hi].mean()
+        cy = y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def resample_ohlc(times, open_, high, low, close, freq):
+    # Candles of a fixed-length period (see CANDLE_TIMEFRAMES) from sorted
+    # int64 ns times; returns a dict of datetime (period start) and OHLC
+    step = pd.tseries.frequencies.to_offset(freq).nanos
+    period = np.asarray(times) // step
+    if not len(period):
+        return {'datetime': period, 'open': open_[:0], 'high': high[:0], 'low': low[:0], 'close': close[:0]}
+    starts = np.flatnonzero(np.append(True, period[1:] != period[:-1]))
+    ends = np.append(starts[1:], len(period)) - 1
+    return {
+        'datetime': period[starts] * step,
+        'open': np.asarray(open_)[starts],
+        'high': np.fmax.reduceat(np.asarray(high), starts),
+        'low': np.fmin.reduceat(np.asarray(low), starts),
+        'close': np.asarray(close)[ends],
+    }
+
+
+def candle_timeframe(times, max_points, finest=None):
+    # Finest of CANDLE_TIMEFRAMES (from `finest` up) giving at most max_points candles
+    times = np.asarray(times)
+    for freq in CANDLE_TIMEFRAMES[CANDLE_TIMEFRAMES.index(finest) if finest else 0:]:
+        period = times // pd.tseries.frequencies.to_offset(freq).nanos
+        if 1 + np.count_nonzero(period[1:] != period[:-1]) <= max_points:
+            return freq
+    return CANDLE_TIMEFRAMES[-1]
+
+
+def trade_markers(trades_df):
+    # Marker series of a trades DataFrame, one per kind: long entries,
+    # short entries and exits; times as int64 ns
+    if trades_df.empty:
+        empty = (np.array([], dtype=np.int64), np.array([], dtype=np.float64))
+        return {'long': empty, 'short': empty, 'exit': empty}
+    entry_times = trades_df['Entry Time'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    entry_prices = trades_df['Entry Price'].to_numpy(dtype=np.float64)
+    long = (trades_df['Type'] == 'long').to_numpy()
+    return {
+        'long': (entry_times[long], entry_prices[long]),
+        'short': (entry_times[~long], entry_prices[~long]),
+        'exit': (trades_df['Exit Time'].to_numpy(dtype='datetime64[ns]').view(np.int64),
+                 trades_df['Exit Price'].to_numpy(dtype=np.float64)),
+    }
+
+
+MARKER_STYLES = {
+    'long': ('Entry (long)', dict(color='green', size=10, symbol='arrow-up')),
+    'short': ('Entry (short)', dict(color='red', size=10, symbol='arrow-down')),
+    'exit': ('Exit', dict(color='blue', size=8, symbol='x')),
+}
+
+
+def plot_window(window, markers, title, max_candles=5000, timeframe=None):
+    """Candle/EMA chart of one window of bars with its trade markers.
+
+    ``window`` holds int64 ns datetime, OHLC and ema9 arrays; candles and
+    the EMA are resampled to ``timeframe``, by default the finest one
+    within max_candles, and each marker kind is a single trace, whatever
+    the number of trades.
+    """
+    times = window['datetime']
+    timeframe = timeframe or candle_timeframe(times, max_candles)
+    candles = resample_ohlc(times, window['open'], window['high'], window['low'], window['close'], timeframe)
+    ema_times, ema = resample_equity(times, window['ema9'], timeframe)
+
+    fig = go.Figure()
+
+    # Add candlestick plot
+    fig.add_trace(go.Candlestick(
+        x=candles['datetime'].view('datetime64[ns]'),
+        open=candles['open'],
+        high=candles['high'],
+        low=candles['low'],
+        close=candles['close'],
+        name=f'Candles ({timeframe})'
+    ))
+
+    # Add EMA9 line
+    fig.add_trace(go.Scatter(
+        x=ema_times.view('datetime64[ns]'),
+        y=ema,
+        mode='lines',
+        line=dict(color='orange', width=1),
+        name='EMA9'
+    ))
+
+    # Mark trades, one trace per kind
+    for kind, (name, marker) in MARKER_STYLES.items():
+        x, y = markers[kind]
+        fig.add_trace(go.Scatter(x=x.view('datetime64[ns]'), y=y, mode='markers', marker=marker, name=name))
+
+    fig.update_layout(
+        title=title,
+        xaxis_title="Time",
+        yaxis_title="Price",
+        xaxis_rangeslider_visible=False,
+        template="plotly_dark"
+    )
+    return fig
+
+
+def _write_plot(filename, window, markers, title, max_candles):
+    plot_window(window, markers, title, max_candles).write_html(filename)
+    return filename
+
+
+def plot_trades(data, trades_df, output_folder='plots', months_per_plot=3, max_candles=5000, workers=None):
+    """Write one HTML candle chart per ``months_per_plot`` window.
+
+    Windows are sliced by binary search on the sorted datetimes (bars) and
+    entry times (trades, which are in entry order) and rendered in a pool
+    of ``workers`` processes (default: one per CPU; 1 renders in-process).
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    if data.empty:
+        print("All plots saved.")
+        return []
+
+    times = data['datetime'].to_numpy(dtype='datetime64[ns]')
+    columns = {c: data[c].to_numpy() for c in ('open', 'high', 'low', 'close', 'ema9')}
+    entries = np.array([], dtype='datetime64[ns]') if trades_df.empty else trades_df['Entry Time'].to_numpy(dtype='datetime64[ns]')
+
+    start_date = pd.Timestamp(times[0])
+    end_date = pd.Timestamp(times[-1])
+    tasks = []
     current_start = start_date
-    plot_idx = 1
-    
     while current_start < end_date:
         current_end = current_start + pd.DateOffset(months=months_per_plot)
-        
-        chunk_data = data[(data['datetime'] >= current_start) & (data['datetime'] < current_end)]
-        chunk_trades = trades_df[(trades_df['Entry Time'] >= current_start) & (trades_df['Entry Time'] < current_end)]
-        
-        fig = go.Figure()
-
-        # Add candlestick plot
-        fig.add_trace(go.Candlestick(
-            x=chunk_data['datetime'],
-            open=chunk_data['open'],
-            high=chunk_data['high'],
-            low=chunk_data['low'],
-            close=chunk_data['close'],
-            name='Candles'
-        ))
-
-        # Add EMA9 line
-        fig.add_trace(go.Scatter(
-            x=chunk_data['datetime'], 
-            y=chunk_data['ema9'], 
-            mode='lines',
-            line=dict(color='orange', width=1),
-            name='EMA9'
-        ))
-
-        # Mark trades
-        for _, trade in chunk_trades.iterrows():
-            color = 'green' if trade['Type'] == 'long' else 'red'
-            fig.add_trace(go.Scatter(
-                x=[trade['Entry Time']], 
-                y=[trade['Entry Price']],
-                mode='markers',
-                marker=dict(color=color, size=10, symbol='arrow-up' if trade['Type']=='long' else 'arrow-down'),
-                name=f"Entry ({trade['Type']})"
-            ))
-            fig.add_trace(go.Scatter(
-                x=[trade['Exit Time']], 
-                y=[trade['Exit Price']],
-                mode='markers',
-                marker=dict(color='blue', size=8, symbol='x'),
-                name="Exit"
-            ))
-
-        fig.update_layout(
-            title=f"Strategy Backtest ({current_start.date()} to {current_end.date()})",
-            xaxis_title="Time",
-            yaxis_title="Price",
-            xaxis_rangeslider_visible=False,
-            template="plotly_dark"
-        )
-        
-        filename = f"{output_folder}/strategy_candles_{plot_idx:03d}.html"
-        fig.write_html(filename)
-        print(f"Saved: {filename}")
+        bounds = np.array([current_start.value, current_end.value]).view('datetime64[ns]')
+        lo, hi = np.searchsorted(times, bounds)
+        window = dict({c: v[lo:hi] for c, v in columns.items()}, datetime=times[lo:hi].view(np.int64))
+
+        # Trades entered in the window
+        t_lo, t_hi = np.searchsorted(entries, bounds)
+        window_markers = trade_markers(trades_df.iloc[t_lo:t_hi])
 
-        plot_idx += 1
+        filename = f"{output_folder}/strategy_candles_{len(tasks) + 1:03d}.html"
+        title = f"Strategy Backtest ({current_start.date()} to {current_end.date()})"
+        tasks.append((filename, window, window_markers, title, max_candles))
         current_start = current_end
 
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            files = list(pool.map(_write_plot, *zip(*tasks)))
+    else:
+        files = [_write_plot(*task) for task in tasks]
+    for filename in files:
+        print(f"Saved: {filename}")
+
     print("All plots saved.")
+    return files
 
 
-def optimize_parameters(filepath, tp_range, sl_range, trailing_range, config):
-    results = []
-    
+def bar_arrays(source):
+    # Zero-copy datetime (int64 ns) and OHLC (float64) arrays of a
+    # ColumnStore or a dict of arrays, as the simulation expects them
+    times = np.asarray(source['datetime'])
+    if times.dtype.kind == 'M':
+        times = times.astype('datetime64[ns]').view(np.int64)
+    arrays = {'datetime': times}
+    for column in ('open', 'high', 'low', 'close'):
+        values = source[column]
+        arrays[column] = values if values.dtype == np.float64 else values.astype(np.float64)
+    return arrays
+
+
+def strategy_arrays(source, name='ema_crossover', **params):
+    # Counterpart of market_arrays for any registered strategy
+    return dict(bar_arrays(source), signal=get_signals(source, name, **params))
+
+
+def prepare_data(filepath, cache_dir=None):
+    data = load_minute_data(filepath, cache_dir)
+    data = calculate_ema(data)
+    data = detect_signals(data)
+    return data
+
+
+def grid_configs(tp_range, sl_range, trailing_range, config):
+    # One independent config per grid cell, keyed by (tp, sl, trailing) ticks
+    cells = []
     for tp_ticks, sl_ticks, trailing_ticks in product(tp_range, sl_range, trailing_range):
-        # Update config for this run
-        config['tp_ticks'] = tp_ticks
-        config['sl_ticks'] = sl_ticks
-        
+        cell = dict(config, tp_ticks=tp_ticks, sl_ticks=sl_ticks)
         if trailing_ticks == 0:
-            config['trailing_stop'] = False
-            config['trailing_stop_ticks'] = 0
+            cell['trailing_stop'] = False
+            cell['trailing_stop_ticks'] = 0
         else:
-            config['trailing_stop'] = True
-            config['trailing_stop_ticks'] = trailing_ticks
-        
-        print(f"Testing TP={tp_ticks} SL={sl_ticks} TSL={trailing_ticks}")
-        
-        try:
-            data = load_minute_data(filepath)
-            data = calculate_ema(data)
-            data = detect_signals(data)
-            trades_df = simulate_trades(data, config)
-            metrics = analyze_performance(trades_df)
-
-            if metrics:  # Only if any trades occurred
-                results.append({
-                    'TP_Ticks': tp_ticks,
-                    'SL_Ticks': sl_ticks,
-                    'Trailing_Ticks': trailing_ticks,
-                    'Total Profit': metrics['Total Profit'],
-                    'Win Rate': metrics['Win Rate'],
-                    'Sharpe Ratio': metrics['Sharpe Ratio'],
-                    'Max Drawdown': metrics['Max Drawdown'],
-                    'Total Trades': metrics['Total Trades'],
-                    'Average Profit per Trade': metrics['Average Profit per Trade']
-                })
+            cell['trailing_stop'] = True
+            cell['trailing_stop_ticks'] = trailing_ticks
+        cells.append(((tp_ticks, sl_ticks, trailing_ticks), cell))
+    return cells
 
+
+def optimization_row(key, metrics):
+    tp_ticks, sl_ticks, trailing_ticks = key
+    return {
+        'TP_Ticks': tp_ticks,
+        'SL_Ticks': sl_ticks,
+        'Trailing_Ticks': trailing_ticks,
+        'Total Profit': metrics['Total Profit'],
+        'Win Rate': metrics['Win Rate'],
+        'Sharpe Ratio': metrics['Sharpe Ratio'],
+        'Max Drawdown': metrics['Max Drawdown'],
+        'Total Trades': metrics['Total Trades'],
+        'Average Profit per Trade': metrics['Average Profit per Trade']
+    }
+
+
+def evaluate_grid(arrays, cells, start=4):
+    """Run grid cells over prepared arrays in one batched simulation.
+
+    Returns one (key, metrics, error) tuple per cell, in cell order; a failing
+    cell carries its exception instead of stopping the sweep.
+    """
+    errors = {}
+    runnable = []
+    for key, cell in cells:
+        try:
+            position_size(cell['starting_balance'], cell)
+            runnable.append((key, cell))
         except Exception as e:
-            print(f"Error at TP={tp_ticks}, SL={sl_ticks}, TSL={trailing_ticks}: {e}")
-    
+            errors[key] = e
+
+    fills = dict(zip([key for key, _ in runnable], simulate_grid(arrays, [cell for _, cell in runnable], start)))
+
+    metrics = dict(zip(fills, batch_performance_metrics([f['pnl'] for f in fills.values()])))
+    out = []
+    for key, _ in cells:
+        if key in errors:
+            out.append((key, None, errors[key]))
+        else:
+            out.append((key, _analysis(metrics[key]), None))
+    return out
+
+
+def publish_arrays(arrays, folder):
+    # One .npy file per column so other processes can memory-map them
+    for name, values in arrays.items():
+        np.save(os.path.join(folder, f"{name}.npy"), values)
+    return folder
+
+
+def open_arrays(folder):
+    return {
+        name[:-4]: np.load(os.path.join(folder, name), mmap_mode='r')
+        for name in os.listdir(folder) if name.endswith('.npy')
+    }
+
+
+def _evaluate_grid_chunk(folder, cells):
+    # Worker entry point: errors travel back as strings so they always pickle
+    arrays = open_arrays(folder)
+    return [
+        (key, metrics, None if error is None else str(error))
+        for key, metrics, error in evaluate_grid(arrays, cells)
+    ]
+
+
+def evaluate_grid_parallel(arrays, cells, workers=None):
+    """Spread grid cells over a process pool.
+
+    The prepared arrays are written once to memory-mapped .npy files that
+    every worker maps read-only, so the data is never pickled per task.
+    Cells are split into contiguous chunks (each still batched through
+    simulate_grid) and results come back in cell order.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(cells) <= 1:
+        return evaluate_grid(arrays, cells)
+
+    size = -(-len(cells) // (workers * 4))
+    chunks = [cells[i:i + size] for i in range(0, len(cells), size)]
+    with tempfile.TemporaryDirectory(prefix='backtest_arrays_') as folder:
+        publish_arrays(arrays, folder)
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            parts = list(pool.map(_evaluate_grid_chunk, [folder] * len(chunks), chunks))
+    return [row for part in parts for row in part]
+
+
+def collect_optimization_results(evaluated):
+    results = []
+    for key, metrics, error in evaluated:
+        tp_ticks, sl_ticks, trailing_ticks = key
+        if error is not None:
+            print(f"Error at TP={tp_ticks}, SL={sl_ticks}, TSL={trailing_ticks}: {error}")
+        elif metrics:  # Only if any trades occurred
+            results.append(optimization_row(key, metrics))
+    return results
+
+
+def optimize_parameters(filepath, tp_range, sl_range, trailing_range, config, workers=1):
+    cells = grid_configs(tp_range, sl_range, trailing_range, config)
+    for tp_ticks, sl_ticks, trailing_ticks in (key for key, _ in cells):
+        print(f"Testing TP={tp_ticks} SL={sl_ticks} TSL={trailing_ticks}")
+
+    # Data preparation does not depend on the grid, so it runs once
+    try:
+        arrays = market_arrays(prepare_data(filepath))
+        evaluated = evaluate_grid_parallel(arrays, cells, workers)
+    except Exception as e:
+        evaluated = [(key, None, e) for key, _ in cells]
+
+    results = collect_optimization_results(evaluated)
     results_df = pd.DataFrame(results)
     results_df.to_csv('optimization_results.csv', index=False)
     
@@ -331,16 +1727,408 @@ def optimize_parameters(filepath, tp_range, sl_range, trailing_range, config):
 
 
 
-def run_backtest(filepath):
+def _quiet(snapshot):
+    pass
+
+
+def simulate_strategies(source, runs, config):
+    """Simulate (key, signal column) pairs over one source's bars.
+
+    Returns one (key, fills, error) tuple per run; a failing run carries its
+    error as a string instead of stopping the others.
+    """
+    base = bar_arrays(source)
+    out = []
+    for key, column in runs:
+        try:
+            out.append((key, simulate_arrays(dict(base, signal=source[column]), config, on_progress=_quiet), None))
+        except Exception as e:
+            out.append((key, None, str(e)))
+    return out
+
+
+def _simulate_strategies_chunk(folder, runs, config, store=False):
+    # Worker entry point over memory-mapped columns
+    return simulate_strategies(ColumnStore(folder) if store else open_arrays(folder), runs, config)
+
+
+def run_strategies(source, strategies, config, workers=None):
+    """Evaluate several strategies against one loaded dataset.
+
+    ``source`` is a ColumnStore or an arrays dict (market_arrays), loaded
+    once; ``strategies`` is a list of (name, params) pairs. Signals and the
+    indicators behind them are computed here, memoized on the source, so
+    strategies sharing an indicator compute it once. The simulations then
+    run in a process pool over memory-mapped columns: the store's own files,
+    or a temporary copy of the arrays. Returns one (key, fills, error) tuple
+    per strategy, in order.
+    """
+    if not isinstance(source, ColumnStore):
+        source = dict(source)
+    results = {}
+    runs = []
+    for i, (name, params) in enumerate(strategies):
+        try:
+            key = strategy_key(name, **params)
+            get_signals(source, name, **params)
+            runs.append((i, f"signal_{key}"))
+            results[i] = (key, None, None)
+        except Exception as e:
+            results[i] = (name, None, str(e))
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(runs) <= 1:
+        simulated = simulate_strategies(source, runs, config)
+    elif isinstance(source, ColumnStore):
+        with ProcessPoolExecutor(max_workers=min(workers, len(runs))) as pool:
+            parts = pool.map(_simulate_strategies_chunk, [source.folder] * len(runs), [[run] for run in runs],
+                             [config] * len(runs), [True] * len(runs))
+            simulated = [row for part in parts for row in part]
+    else:
+        with tempfile.TemporaryDirectory(prefix='backtest_arrays_') as folder:
+            publish_arrays(source, folder)
+            with ProcessPoolExecutor(max_workers=min(workers, len(runs))) as pool:
+                parts = pool.map(_simulate_strategies_chunk, [folder] * len(runs), [[run] for run in runs],
+                                 [config] * len(runs))
+                simulated = [row for part in parts for row in part]
+
+    for i, fills, error in simulated:
+        results[i] = (results[i][0], fills, error)
+    return [results[i] for i in range(len(strategies))]
+
+
+def walk_forward_windows(times, train_period, test_period, anchored=False):
+    """Row bounds (train_start, test_start, test_end) of walk-forward folds.
+
+    ``times`` are sorted int64 ns bar times (NaT, sorted last, is ignored).
+    Test windows of ``test_period`` follow each other without overlap; the
+    training window is the ``train_period`` before each one, or everything
+    since the first bar when ``anchored``.
+    """
+    times = np.asarray(times)
+    valid = times[times != np.iinfo(np.int64).min]
+    if not len(valid):
+        return []
+    train = pd.Timedelta(train_period).value
+    test = pd.Timedelta(test_period).value
+    first, last = valid[0], valid[-1]
+    folds = []
+    test_start = first + train
+    while test_start <= last:
+        train_start = first if anchored else test_start - train
+        bounds = np.searchsorted(valid, [train_start, test_start, test_start + test])
+        folds.append(tuple(int(b) for b in bounds))
+        test_start += test
+    return folds
+
+
+def walk_forward_fold(arrays, bounds, cells):
+    """Grid search on a fold's training rows, then run the winner on its test rows.
+
+    The signals come from the full series (the EMA is causal), so a fold
+    only slices the prepared arrays. The winner is the cell with the best
+    training Sharpe ratio, as in optimize_parameters. Returns
+    (best_key, train_metrics, test_fills); best_key is None when no cell
+    traded.
+    """
+    train_start, test_start, test_end = bounds
+    train = {name: values[train_start:test_start] for name, values in arrays.items()}
+    rows = []
+    for key, metrics, error in evaluate_grid(train, cells, start=max(4 - train_start, 0)):
+        if error is None and metrics:
+            rows.append((key, metrics))
+    if not rows:
+        return None, None, np.zeros(0, dtype=FILL_DTYPE)
+    ranked = pd.DataFrame({'Sharpe Ratio': [m['Sharpe Ratio'] for _, m in rows]}).sort_values(
+        by='Sharpe Ratio', ascending=False)
+    best_key, best_metrics = rows[ranked.index[0]]
+
+    test = {name: values[test_start:test_end] for name, values in arrays.items()}
+    fills = simulate_arrays(test, dict(cells)[best_key], start=max(4 - test_start, 0), on_progress=_quiet)
+    fills['entry_idx'] += test_start
+    fills['exit_idx'] += test_start
+    return best_key, best_metrics, fills
+
+
+def _walk_forward_fold_chunk(folder, bounds, cells):
+    # Worker entry point: errors travel back as strings so they always pickle
+    try:
+        return walk_forward_fold(open_arrays(folder), bounds, cells) + (None,)
+    except Exception as e:
+        return None, None, None, str(e)
+
+
+def walk_forward_optimize(filepath, tp_range, sl_range, trailing_range, config, train_period='365D',
+                          test_period='90D', anchored=False, workers=1, cache_dir=None):
+    """Walk-forward optimization over rolling (or anchored) windows.
+
+    Each fold grid-searches its training window and trades the winning
+    parameters on the following test window. Folds run in a process pool
+    over one set of memory-mapped prepared arrays. Returns (folds_df,
+    oos_trades): one row per fold, and the out-of-sample trades of all
+    folds stitched into a single equity curve ('Balance After Trade').
+    Both are also written to walk_forward_folds.csv and
+    walk_forward_trades.csv.
+    """
+    cells = grid_configs(tp_range, sl_range, trailing_range, config)
+    arrays = market_arrays(prepare_data(filepath, cache_dir))
+    folds = walk_forward_windows(arrays['datetime'], train_period, test_period, anchored)
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(folds) <= 1:
+        results = []
+        for bounds in folds:
+            try:
+                results.append(walk_forward_fold(arrays, bounds, cells) + (None,))
+            except Exception as e:
+                results.append((None, None, None, str(e)))
+    else:
+        with tempfile.TemporaryDirectory(prefix='backtest_arrays_') as folder:
+            publish_arrays(arrays, folder)
+            with ProcessPoolExecutor(max_workers=min(workers, len(folds))) as pool:
+                results = list(pool.map(_walk_forward_fold_chunk, [folder] * len(folds), folds,
+                                        [cells] * len(folds)))
+
+    rows = []
+    oos = []
+    times = arrays['datetime']
+    for i, ((train_start, test_start, test_end), (key, train_metrics, fills, error)) in enumerate(zip(folds, results)):
+        if error is not None:
+            print(f"Error in fold {i}: {error}")
+        row = {
+            'Fold': i,
+            'Train Start': pd.Timestamp(times[train_start]),
+            'Test Start': pd.Timestamp(times[test_start]) if test_start < len(times) else pd.NaT,
+            'Test End': pd.Timestamp(times[test_end - 1]) if test_end > test_start else pd.NaT,
+            'TP_Ticks': None, 'SL_Ticks': None, 'Trailing_Ticks': None,
+            'Train Sharpe Ratio': None, 'Test Trades': 0, 'Test Profit': 0.0,
+        }
+        if key is not None:
+            row['TP_Ticks'], row['SL_Ticks'], row['Trailing_Ticks'] = key
+            row['Train Sharpe Ratio'] = train_metrics['Sharpe Ratio']
+            row['Test Trades'] = len(fills)
+            row['Test Profit'] = float(fills['pnl'].sum())
+            oos.append(fills)
+        rows.append(row)
+
+    folds_df = pd.DataFrame(rows)
+    oos_trades = fills_to_trades(np.concatenate(oos) if oos else np.zeros(0, dtype=FILL_DTYPE))
+    if not oos_trades.empty:
+        # Each fold restarts from the starting balance; chain them instead
+        oos_trades['Balance After Trade'] = config['starting_balance'] + oos_trades['PNL'].cumsum()
+    folds_df.to_csv('walk_forward_folds.csv', index=False)
+    oos_trades.to_csv('walk_forward_trades.csv', index=False)
+    return folds_df, oos_trades
+
+
+def backtest_step(chunk, config, carry=None, span=9):
+    """Advance a streaming backtest by one chunk of bars.
+
+    ``chunk`` comes from _prepare_chunk and must continue the bars seen so
+    far in time order. ``carry`` bundles the EMA carry, the signal lookback,
+    the simulate_chunk state and the last bar time. Returns (fills, carry).
+    """
+    if carry is None:
+        carry = {'ema': None, 'signal': None, 'sim': None, 'last_time': None}
+    last_time = carry['last_time']
+    if len(chunk):
+        if not chunk['datetime'].is_monotonic_increasing or (
+                last_time is not None and chunk['datetime'].iloc[0].value < last_time):
+            raise ValueError("Streaming backtest needs a file sorted by date_time")
+        last_time = chunk['datetime'].iloc[-1].value
+
+    chunk['ema9'], ema_carry = ema_array(chunk['close'].to_numpy(), span, carry['ema'])
+    chunk['signal'], signal_carry = detect_signals_array(
+        chunk['open'].to_numpy(), chunk['close'].to_numpy(), chunk['ema9'].to_numpy(), carry['signal'])
+    fills, sim = simulate_chunk(market_arrays(chunk), config, carry['sim'])
+    return fills, {'ema': ema_carry, 'signal': signal_carry, 'sim': sim, 'last_time': last_time}
+
+
+def iter_backtest(filepath, config, chunksize=500_000, span=9):
+    """Stream a CSV through the strategy, yielding trades as they close.
+
+    The file is read ``chunksize`` rows at a time. The EMA state, the 3-bar
+    signal lookback and any open trade are carried across chunk boundaries,
+    so the concatenated output equals simulate_trades on the full file
+    while memory depends only on the chunk size. The file must already be
+    in date_time order (the in-memory path sorts it; a stream cannot).
+    """
+    carry = None
+    for chunk in pd.read_csv(filepath, parse_dates=['date_time'], chunksize=chunksize):
+        fills, carry = backtest_step(_prepare_chunk(chunk), config, carry, span)
+        if len(fills):
+            yield fills_to_trades(fills)
+
+
+# Incremental backtests: the carry of backtest_step is persisted per dataset
+# and parameter set, so bars appended to a file are simulated on their own.
+
+def incremental_key(filepath, config, span=9):
+    spec = json.dumps({'path': os.path.realpath(filepath), 'config': config, 'span': span}, sort_keys=True)
+    return hashlib.sha256(spec.encode()).hexdigest()
+
+
+def _carry_to_json(carry):
+    sim = dict(carry['sim'])
+    if sim['trade'] is not None:
+        trade = sim['trade']
+        sim['trade'] = {'entry_idx': int(trade['entry_idx']), 'entry_time': int(trade['entry_time']),
+                        'side': int(trade['side']), 'entry_price': float(trade['entry_price']),
+                        'extreme': float(trade['extreme'])}
+    return {
+        'ema': carry['ema'],
+        'signal': None if carry['signal'] is None else {k: v.tolist() for k, v in carry['signal'].items()},
+        'sim': {'offset': int(sim['offset']), 'balance': float(sim['balance']), 'trade': sim['trade']},
+        'last_time': carry['last_time'],
+    }
+
+
+def _carry_from_json(carry):
+    signal = carry['signal']
+    if signal is not None:
+        signal = {k: np.array(v, dtype=bool) for k, v in signal.items()}
+    return dict(carry, signal=signal)
+
+
+def load_incremental_state(folder):
+    # (state, fills) saved by save_incremental_state, or (None, None)
+    try:
+        with open(os.path.join(folder, 'state.json')) as f:
+            state = json.load(f)
+        fills = np.load(os.path.join(folder, 'fills.npy'))
+    except (OSError, ValueError):
+        return None, None
+    state['carry'] = _carry_from_json(state['carry'])
+    # fills.npy is replaced before state.json, so it may hold extra rows
+    return state, fills[:state['fills']]
+
+
+def save_incremental_state(folder, state, fills):
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, 'fills.tmp.npy'), 'wb') as f:
+        np.save(f, fills)
+    os.replace(os.path.join(folder, 'fills.tmp.npy'), os.path.join(folder, 'fills.npy'))
+    state = dict(state, carry=_carry_to_json(state['carry']), fills=len(fills))
+    with open(os.path.join(folder, 'state.tmp.json'), 'w') as f:
+        json.dump(state, f)
+    os.replace(os.path.join(folder, 'state.tmp.json'), os.path.join(folder, 'state.json'))
+
+
+class _FileSlice(io.RawIOBase):
+    # Read-only view of f up to byte `end`
+    def __init__(self, f, end):
+        self.f = f
+        self.end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), self.end - self.f.tell())
+        if n <= 0:
+            return 0
+        data = self.f.read(n)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _tail_digest(f, end, size=4096):
+    f.seek(max(end - size, 0))
+    return hashlib.sha256(f.read(min(size, end))).hexdigest()
+
+
+def _complete_lines_end(f, start, block=1 << 16):
+    # Offset just past the last newline at or after start (start if none)
+    end = f.seek(0, os.SEEK_END)
+    while end > start:
+        pos = max(end - block, start)
+        f.seek(pos)
+        i = f.read(end - pos).rfind(b'\n')
+        if i >= 0:
+            return pos + i + 1
+        end = pos
+    return start
+
+
+def update_backtest(filepath, config, state_dir, span=9, chunksize=500_000):
+    """Extend a persisted backtest with the bars appended to ``filepath``.
+
+    The EMA/signal carries, the open position and the trades so far are
+    kept under ``state_dir`` per dataset and parameter set. Each call only
+    parses the complete lines added since the previous one; if the part of
+    the file already processed has changed, the state is rebuilt from the
+    start. The file must be in date_time order, as for iter_backtest.
+    Returns the trades of the whole history, equal to simulate_trades on
+    the full file.
+    """
+    folder = os.path.join(state_dir, incremental_key(filepath, config, span))
+    state, fills = load_incremental_state(folder)
+    with open(filepath, 'rb') as f:
+        if state is not None:
+            size = f.seek(0, os.SEEK_END)
+            if size < state['size'] or _tail_digest(f, state['size']) != state['tail']:
+                state = None
+        if state is None:
+            f.seek(0)
+            header = f.readline()
+            columns = pd.read_csv(io.BytesIO(header), nrows=0).columns.tolist()
+            state = {'columns': columns, 'size': len(header), 'carry': None}
+            fills = np.zeros(0, dtype=FILL_DTYPE)
+
+        start = state['size']
+        end = _complete_lines_end(f, start)
+        if end > start:
+            f.seek(start)
+            reader = pd.read_csv(io.BufferedReader(_FileSlice(f, end)), header=None, names=state['columns'],
+                                 parse_dates=['date_time'], chunksize=chunksize)
+            carry = state['carry']
+            parts = [fills]
+            for chunk in reader:
+                new, carry = backtest_step(_prepare_chunk(chunk), config, carry, span)
+                parts.append(new)
+            fills = np.concatenate(parts)
+            state = dict(state, size=end, tail=_tail_digest(f, end), carry=carry)
+            save_incremental_state(folder, state, fills)
+    return fills_to_trades(fills)
+
+
+def run_backtest(filepath, chunksize=None, state_dir=None, plots=True):
+    # With chunksize the file is streamed through iter_backtest, with
+    # state_dir only newly appended bars are simulated (update_backtest);
+    # plots need the full series in memory and are skipped in both modes.
+    # plots=False skips them in the in-memory mode as well.
+    if chunksize or state_dir:
+        if state_dir:
+            trades_df = update_backtest(filepath, CONFIG, state_dir, chunksize=chunksize or 500_000)
+        else:
+            parts = list(iter_backtest(filepath, CONFIG, chunksize))
+            trades_df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+        metrics = analyze_performance(trades_df)
+        save_trades(trades_df)
+        save_metrics(metrics)
+        return trades_df, metrics
+
     data = load_minute_data(filepath)
     data = calculate_ema(data)
     data = detect_signals(data)
-    trades_df = simulate_trades(data, CONFIG)
+    arrays = market_arrays(data)
+    fills = simulate_arrays(arrays, CONFIG)
+    trades_df = fills_to_trades(fills)
     metrics = analyze_performance(trades_df)
 
+    # Time-sampled risk figures from the bar-level equity
+    risk = equity_curve_metrics(arrays, fills, CONFIG, 'D')
+    metrics.update({
+        'Daily Sharpe Ratio': risk['sharpe_ratio'],
+        'Daily Sortino Ratio': risk['sortino_ratio'],
+        'Bar Max Drawdown': risk['max_drawdown'],
+        'Bar Max Drawdown %': risk['max_drawdown_pct'] * 100,
+    })
+
     save_trades(trades_df)
     save_metrics(metrics)
-    plot_trades(data, trades_df)
+    if plots:
+        plot_trades(data, trades_df)
     
     return trades_df, metrics
 
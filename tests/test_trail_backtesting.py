@@ -0,0 +1,534 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import trail_backtesting as tb
+
+
+def make_bars(n, seed=0, nan_fraction=0.0, flat=False):
+    """Random-walk minute bars on the 0.25 tick grid, in time order"""
+    rng = np.random.default_rng(seed)
+    close = 15000 + np.round(np.cumsum(rng.normal(0, 2, n)) * 4) / 4
+    open_ = close.copy() if flat else close + np.round(rng.normal(0, 2, n) * 4) / 4
+    high = np.maximum(open_, close) + np.round(rng.random(n) * 12) / 4
+    low = np.minimum(open_, close) - np.round(rng.random(n) * 12) / 4
+    if nan_fraction:
+        close[rng.random(n) < nan_fraction] = np.nan
+    return pd.DataFrame({
+        'datetime': pd.Timestamp('2021-01-04') + pd.to_timedelta(np.arange(n), 'min'),
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': rng.integers(1, 100, n),
+    })
+
+
+def with_signals(data, detect):
+    return detect(tb.calculate_ema(data.copy()))
+
+
+# detect_signals (user-001)
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('nan_fraction', [0.0, 0.02])
+def test_detect_signals_matches_loop(seed, nan_fraction):
+    data = make_bars(2000, seed, nan_fraction)
+    expected = with_signals(data, tb.detect_signals_loop)['signal']
+    assert expected.abs().sum() > 0
+    np.testing.assert_array_equal(with_signals(data, tb.detect_signals)['signal'], expected)
+
+
+def test_detect_signals_unsorted_rows_match_loop():
+    # Both work in row order, whatever the timestamps say
+    data = make_bars(1500, seed=7).sample(frac=1, random_state=1).reset_index(drop=True)
+    np.testing.assert_array_equal(
+        with_signals(data, tb.detect_signals)['signal'],
+        with_signals(data, tb.detect_signals_loop)['signal'],
+    )
+
+
+@pytest.mark.parametrize('n', [0, 1, 3, 4, 300])
+def test_detect_signals_without_signals(n):
+    data = make_bars(n, flat=True)  # no candle body, so no setup
+    assert not with_signals(data, tb.detect_signals)['signal'].any()
+    assert not with_signals(data, tb.detect_signals_loop)['signal'].any()
+
+
+@pytest.mark.parametrize('chunk', [1, 2, 3, 7, 500])
+def test_detect_signals_array_chunks_match_one_call(chunk):
+    data = tb.calculate_ema(make_bars(1000, seed=3, nan_fraction=0.01))
+    open_, close, ema = (data[c].to_numpy() for c in ('open', 'close', 'ema9'))
+    expected, _ = tb.detect_signals_array(open_, close, ema)
+    parts, carry = [], None
+    for i in range(0, len(data), chunk):
+        signal, carry = tb.detect_signals_array(open_[i:i + chunk], close[i:i + chunk], ema[i:i + chunk], carry)
+        parts.append(signal)
+    np.testing.assert_array_equal(np.concatenate(parts), expected)
+
+
+# simulate_trades (user-002)
+
+CONFIGS = [
+    tb.CONFIG,
+    dict(tb.CONFIG, tp_ticks=12, sl_ticks=30),
+    dict(tb.CONFIG, trailing_stop=True, trailing_stop_ticks=5),
+    dict(tb.CONFIG, trailing_stop=True, trailing_stop_ticks=3, tp_ticks=40, sl_ticks=10),
+]
+
+
+def assert_same_trades(actual, expected):
+    if expected.empty:
+        assert actual.empty
+        return
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected, check_dtype=False)
+
+
+@pytest.mark.parametrize('config', CONFIGS)
+@pytest.mark.parametrize('seed', range(3))
+def test_simulate_trades_matches_loop(config, seed):
+    data = with_signals(make_bars(3000, seed), tb.detect_signals)
+    expected = tb.simulate_trades_loop(data, config)
+    assert len(expected) > 10
+    assert_same_trades(tb.simulate_trades(data, config), expected)
+
+
+def test_simulate_trades_unsorted_rows_match_loop():
+    data = make_bars(2000, seed=11).sample(frac=1, random_state=2).reset_index(drop=True)
+    data = with_signals(data, tb.detect_signals)
+    assert_same_trades(tb.simulate_trades(data, CONFIGS[2]), tb.simulate_trades_loop(data, CONFIGS[2]))
+
+
+@pytest.mark.parametrize('n', [0, 4, 500])
+def test_simulate_trades_without_signals(n):
+    data = with_signals(make_bars(n, flat=True), tb.detect_signals)
+    assert tb.simulate_trades(data, tb.CONFIG).empty
+    assert tb.simulate_trades_loop(data, tb.CONFIG).empty
+
+
+# simulate_grid (user-003)
+
+def grid_cells(config=tb.CONFIG):
+    return tb.grid_configs([8, 20], [6, 16], [0, 3, 7], config)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_simulate_grid_matches_per_config_runs(seed):
+    arrays = tb.market_arrays(with_signals(make_bars(4000, seed, nan_fraction=0.01), tb.detect_signals))
+    configs = [cell for _, cell in grid_cells()]
+    for fills, config in zip(tb.simulate_grid(arrays, configs), configs):
+        expected = tb.simulate_arrays(arrays, config)
+        assert len(expected) > 0
+        np.testing.assert_array_equal(fills, expected)
+
+
+def test_simulate_grid_matches_loop_trades():
+    data = with_signals(make_bars(3000, seed=5), tb.detect_signals)
+    cells = grid_cells()
+    grid = tb.simulate_grid(tb.market_arrays(data), [cell for _, cell in cells])
+    for fills, (_, config) in zip(grid, cells):
+        assert_same_trades(tb.fills_to_trades(fills), tb.simulate_trades_loop(data, config))
+
+
+def test_simulate_grid_without_signals():
+    arrays = tb.market_arrays(with_signals(make_bars(300, flat=True), tb.detect_signals))
+    configs = [cell for _, cell in grid_cells()]
+    assert [len(fills) for fills in tb.simulate_grid(arrays, configs)] == [0] * len(configs)
+    assert tb.simulate_grid(arrays, []) == []
+
+
+# evaluate_grid_parallel (user-004)
+
+def assert_same_metrics(actual, expected):
+    assert actual.keys() == expected.keys()
+    for name, value in expected.items():
+        assert actual[name] == pytest.approx(value, rel=1e-9, abs=1e-9, nan_ok=True), name
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_evaluate_grid_parallel_matches_per_cell_runs(workers):
+    data = with_signals(make_bars(4000, seed=7), tb.detect_signals)
+    cells = grid_cells()
+    # A cell whose sizing fails reports its error without stopping the sweep
+    cells.append(((8, 0, 0), dict(tb.CONFIG, tp_ticks=8, sl_ticks=0)))
+    evaluated = tb.evaluate_grid_parallel(tb.market_arrays(data), cells, workers=workers)
+
+    assert [key for key, _, _ in evaluated] == [key for key, _ in cells]
+    for (key, metrics, error), (_, cell) in zip(evaluated[:-1], cells[:-1]):
+        assert error is None, key
+        assert_same_metrics(metrics, tb.analyze_performance(tb.simulate_trades(data, cell)))
+    key, metrics, error = evaluated[-1]
+    assert metrics is None and error is not None
+
+
+# iter_backtest (user-007)
+
+def write_csv(path, bars):
+    # Same layout as the exported minute files: UTC date_time first
+    bars = bars.rename(columns={'datetime': 'date_time'})
+    bars['date_time'] = bars['date_time'].dt.tz_localize('UTC')
+    bars.to_csv(path, index=False)
+    return path
+
+
+def batch_trades(path, config):
+    return tb.simulate_trades(tb.prepare_data(path), config)
+
+
+@pytest.mark.parametrize('chunksize', [1, 7, 250, 10_000])
+@pytest.mark.parametrize('config', [CONFIGS[1], CONFIGS[3]])
+def test_iter_backtest_matches_batch(tmp_path, chunksize, config):
+    path = write_csv(tmp_path / 'bars.csv', make_bars(1500 if chunksize > 1 else 300, seed=3, nan_fraction=0.01))
+    expected = batch_trades(path, config)
+    assert len(expected) > 0
+    parts = list(tb.iter_backtest(path, config, chunksize=chunksize))
+    assert_same_trades(pd.concat(parts, ignore_index=True), expected)
+
+
+def test_iter_backtest_rejects_unsorted_file(tmp_path):
+    bars = make_bars(600, seed=4)
+    path = write_csv(tmp_path / 'bars.csv', pd.concat([bars[300:], bars[:300]]))
+    with pytest.raises(ValueError):
+        list(tb.iter_backtest(path, tb.CONFIG, chunksize=100))
+    with pytest.raises(ValueError):
+        list(tb.iter_backtest(path, tb.CONFIG, chunksize=10_000))
+
+
+def test_iter_backtest_without_signals(tmp_path):
+    path = write_csv(tmp_path / 'bars.csv', make_bars(400, flat=True))
+    assert list(tb.iter_backtest(path, tb.CONFIG, chunksize=50)) == []
+
+
+# update_backtest (user-013)
+
+def test_update_backtest_matches_full_rerun(tmp_path):
+    full = write_csv(tmp_path / 'full.csv', make_bars(3000, seed=8)).read_bytes()
+    path = tmp_path / 'bars.csv'
+    state_dir = tmp_path / 'state'
+    config = CONFIGS[3]
+
+    # Grow the file in pieces, the last cut falling inside a line
+    cuts = [full.index(b'\n', 20_000) + 1, full.index(b'\n', 90_000) + 1, 150_000, len(full)]
+    written = 0
+    for cut in cuts:
+        with open(path, 'ab') as f:
+            f.write(full[written:cut])
+        written = cut
+        trades = tb.update_backtest(path, config, state_dir, chunksize=400)
+        complete = full[:full.rindex(b'\n', 0, cut) + 1]
+        (tmp_path / 'expected.csv').write_bytes(complete)
+        assert_same_trades(trades, batch_trades(tmp_path / 'expected.csv', config))
+    assert len(trades) > 0
+
+
+def test_update_backtest_rebuilds_changed_history(tmp_path):
+    bars = make_bars(2000, seed=9)
+    path = write_csv(tmp_path / 'bars.csv', bars)
+    state_dir = tmp_path / 'state'
+    before = tb.update_backtest(path, CONFIGS[1], state_dir)
+
+    # Rewrite the last bars, which were already processed, in place
+    prices = ['open', 'high', 'low', 'close']
+    bars.loc[1500:, prices] = make_bars(2000, seed=19).loc[1500:, prices]
+    write_csv(path, bars)
+    changed = batch_trades(path, CONFIGS[1])
+    assert not changed.equals(before)
+    assert_same_trades(tb.update_backtest(path, CONFIGS[1], state_dir), changed)
+
+    # A shorter file is a rewrite as well
+    write_csv(path, bars[:1200])
+    assert_same_trades(tb.update_backtest(path, CONFIGS[1], state_dir), batch_trades(path, CONFIGS[1]))
+
+
+# column store eviction (user-006)
+
+def store_size(store):
+    return sum(f.stat().st_size for f in os.scandir(store.folder) if f.is_file())
+
+
+def test_evict_column_stores_skips_open_stores(tmp_path):
+    cache = tmp_path / 'cache'
+    a = tb.open_column_store(write_csv(tmp_path / 'a.csv', make_bars(2000, seed=1)), cache)
+    budget = store_size(a) + 1000
+
+    # Building B would evict A, which is still open
+    b = tb.open_column_store(write_csv(tmp_path / 'b.csv', make_bars(2000, seed=2)), cache, max_bytes=budget)
+    arrays = tb.strategy_arrays(a, 'ema_crossover')
+    np.testing.assert_array_equal(arrays['close'], a['close'])
+    assert os.path.exists(a.folder) and os.path.exists(b.folder)
+
+    # Once closed, A is the least recently used store and goes next
+    a.close()
+    c = tb.open_column_store(write_csv(tmp_path / 'c.csv', make_bars(2000, seed=3)), cache, max_bytes=budget)
+    assert not os.path.exists(a.folder)
+    assert os.path.exists(b.folder) and os.path.exists(c.folder)
+
+
+def test_open_column_store_rebuilds_evicted_store(tmp_path):
+    path = write_csv(tmp_path / 'a.csv', make_bars(500, seed=1))
+    cache = tmp_path / 'cache'
+    with tb.open_column_store(path, cache) as store:
+        folder = store.folder
+        expected = store.frame()
+    assert tb.evict_column_stores(cache, 0) == 1
+    assert not os.path.exists(folder)
+    with tb.open_column_store(path, cache) as store:
+        assert store.folder == folder
+        pd.testing.assert_frame_equal(store.frame(), expected)
+
+
+# equity metrics (user-018)
+
+@pytest.mark.parametrize('freq', ['D', 'h', None])
+def test_equity_curve_metrics_blocks_match_one_pass(monkeypatch, freq):
+    arrays = tb.market_arrays(with_signals(make_bars(5000, seed=6, nan_fraction=0.01), tb.detect_signals))
+    fills = tb.simulate_arrays(arrays, CONFIGS[2])
+    assert len(fills) > 0
+    equity = tb.equity_curve(arrays, fills, tb.CONFIG)
+    expected = tb.equity_curve_metrics(arrays, fills, tb.CONFIG, freq)
+    assert expected['periods'] > 0
+
+    monkeypatch.setattr(tb, 'CHUNK_BARS', 77)
+    np.testing.assert_array_equal(tb.equity_curve(arrays, fills, tb.CONFIG), equity)
+    assert tb.equity_curve_metrics(arrays, fills, tb.CONFIG, freq) == expected
+    assert tb.equity_metrics(arrays['datetime'], equity, freq) == expected
+
+
+# indicators and strategies (user-014)
+
+INDICATOR_CASES = [('ema', {}), ('ema', {'span': 21}), ('sma', {'span': 30}), ('atr', {}), ('rsi', {}),
+                   ('vwap', {}), ('vwap', {'span': 50})]
+STRATEGY_CASES = [('ema_crossover', {}), ('sma_cross', {'fast': 5, 'slow': 20}), ('rsi_reversion', {})]
+
+
+def bar_source(n, seed=0, nan_fraction=0.0):
+    # 7 minutes apart, so calendar days (daily VWAP) end inside blocks of 77
+    data = make_bars(n, seed, nan_fraction)
+    data['datetime'] = pd.Timestamp('2021-01-04') + pd.to_timedelta(np.arange(n) * 7, 'min')
+    return {column: data[column].to_numpy() for column in data.columns}
+
+
+def bar_source_from(path):
+    data = tb.load_minute_data(path)
+    return {column: data[column].to_numpy() for column in data.columns if column != 'symbol'}
+
+
+@pytest.mark.parametrize('name,params', INDICATOR_CASES)
+def test_indicator_blocks_match_one_pass(monkeypatch, name, params):
+    source = bar_source(2000, seed=1, nan_fraction=0.02)
+    expected = np.array(tb.get_indicator(dict(source), name, **params))
+    assert np.isfinite(expected).sum() > 500
+    monkeypatch.setattr(tb, 'CHUNK_BARS', 77)
+    np.testing.assert_allclose(tb.get_indicator(dict(source), name, **params), expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize('name,params', STRATEGY_CASES)
+def test_strategy_blocks_match_one_pass(monkeypatch, name, params):
+    source = bar_source(3000, seed=2, nan_fraction=0.01)
+    expected = np.array(tb.get_signals(dict(source), name, **params))
+    assert np.abs(expected).sum() > 0
+    monkeypatch.setattr(tb, 'CHUNK_BARS', 77)
+    np.testing.assert_array_equal(tb.get_signals(dict(source), name, **params), expected)
+
+
+def test_ema_indicator_matches_calculate_ema():
+    data = make_bars(1500, seed=3, nan_fraction=0.02)
+    source = {column: data[column].to_numpy() for column in data.columns}
+    np.testing.assert_array_equal(tb.get_indicator(source, 'ema', span=9), tb.calculate_ema(data)['ema9'])
+
+
+@pytest.mark.parametrize('chunk', [77, tb.CHUNK_BARS])
+def test_ema_crossover_signals_match_detect_signals(monkeypatch, chunk):
+    data = make_bars(3000, seed=4, nan_fraction=0.01)
+    expected = with_signals(data, tb.detect_signals)['signal']
+    monkeypatch.setattr(tb, 'CHUNK_BARS', chunk)
+    source = {column: data[column].to_numpy() for column in data.columns}
+    np.testing.assert_array_equal(tb.get_signals(source, 'ema_crossover'), expected)
+
+
+def test_column_store_memoizes_one_column_per_params(tmp_path, monkeypatch):
+    monkeypatch.setattr(tb, 'CHUNK_BARS', 77)
+    path = write_csv(tmp_path / 'bars.csv', make_bars(1000, seed=5))
+    with tb.open_column_store(path, tmp_path / 'cache') as store:
+        source_files = set(os.listdir(store.folder))
+        signal = np.array(tb.get_signals(store, 'sma_cross', fast=5, slow=20))
+        tb.get_indicator(store, 'sma', span=5)
+        tb.get_signals(store, 'sma_cross', fast=5, slow=20)
+        tb.get_signals(store, 'sma_cross', fast=5, slow=30)
+        added = set(os.listdir(store.folder)) - source_files
+        assert added == {'sma_span5.npy', 'sma_span20.npy', 'sma_span30.npy',
+                         'signal_sma_cross_fast5_slow20.npy', 'signal_sma_cross_fast5_slow30.npy'}
+
+        # A second store object reads the saved column instead of computing it
+        with tb.ColumnStore(store.folder) as again:
+            monkeypatch.setattr(tb.ColumnStore, 'create', None)
+            np.testing.assert_array_equal(tb.get_signals(again, 'sma_cross', fast=5, slow=20), signal)
+    expected = tb.get_signals(bar_source_from(path), 'sma_cross', fast=5, slow=20)
+    np.testing.assert_array_equal(signal, expected)
+
+
+# walk-forward optimization (user-016)
+
+HOUR = pd.Timedelta('1h').value
+
+
+def hourly_times(hours):
+    return pd.Timestamp('2021-01-04').value + np.arange(hours) * HOUR
+
+
+def test_walk_forward_windows_rolling():
+    times = np.append(hourly_times(240), np.iinfo(np.int64).min)  # NaT sorts last
+    assert tb.walk_forward_windows(times, '3D', '2D') == [(0, 72, 120), (48, 120, 168), (96, 168, 216), (144, 216, 240)]
+
+
+def test_walk_forward_windows_anchored():
+    times = hourly_times(240)
+    assert tb.walk_forward_windows(times, '3D', '2D', anchored=True) == [
+        (0, 72, 120), (0, 120, 168), (0, 168, 216), (0, 216, 240)]
+
+
+def test_walk_forward_windows_gaps_and_short_data():
+    # A missing day leaves an empty test window; no fold fits in too little data
+    times = np.concatenate([hourly_times(48), hourly_times(120)[72:]])
+    assert tb.walk_forward_windows(times, '1D', '1D') == [(0, 24, 48), (24, 48, 48), (48, 48, 72), (48, 72, 96)]
+    assert tb.walk_forward_windows(hourly_times(48), '3D', '1D') == []
+    assert tb.walk_forward_windows(np.zeros(0, dtype=np.int64), '1D', '1D') == []
+
+
+def wf_cells():
+    return tb.grid_configs([8, 16], [8, 16], [0, 4], tb.CONFIG)
+
+
+def test_walk_forward_fold_trades_best_training_cell():
+    arrays = tb.market_arrays(with_signals(make_bars(6000, seed=10), tb.detect_signals))
+    cells = wf_cells()
+    folds = tb.walk_forward_windows(arrays['datetime'], '1D', '12h')
+    assert len(folds) >= 4
+    for bounds in folds:
+        train_start, test_start, test_end = bounds
+        key, train_metrics, fills = tb.walk_forward_fold(arrays, bounds, cells)
+
+        train = {name: values[train_start:test_start] for name, values in arrays.items()}
+        sharpe = {k: m['Sharpe Ratio'] for k, m, _ in tb.evaluate_grid(train, cells) if m}
+        # Cells whose trailing stop is tighter than the stop loss tie; any of them may win
+        assert train_metrics['Sharpe Ratio'] == sharpe[key] == np.nanmax(list(sharpe.values()))
+
+        test = {name: values[test_start:test_end] for name, values in arrays.items()}
+        expected = tb.simulate_arrays(test, dict(cells)[key])
+        assert len(fills) == len(expected)
+        np.testing.assert_array_equal(fills['entry_idx'], expected['entry_idx'] + test_start)
+        np.testing.assert_array_equal(fills['exit_idx'], expected['exit_idx'] + test_start)
+        for name in ('entry_time', 'exit_time', 'side', 'entry_price', 'exit_price', 'pnl', 'balance'):
+            np.testing.assert_array_equal(fills[name], expected[name])
+
+
+def test_walk_forward_optimize_workers_match(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # the folds and trades CSVs go to the working directory
+    path = write_csv(tmp_path / 'bars.csv', make_bars(6000, seed=11))
+    args = (path, [8, 16], [8, 16], [0, 4], tb.CONFIG, '1D', '12h')
+    folds, trades = tb.walk_forward_optimize(*args, workers=1)
+    assert len(folds) >= 4 and len(trades) > 0
+    for anchored in (False, True):
+        serial = tb.walk_forward_optimize(*args, anchored=anchored, workers=1)
+        parallel = tb.walk_forward_optimize(*args, anchored=anchored, workers=2)
+        pd.testing.assert_frame_equal(parallel[0], serial[0])
+        pd.testing.assert_frame_equal(parallel[1], serial[1])
+    assert (trades['Balance After Trade'].iloc[-1]
+            == pytest.approx(tb.CONFIG['starting_balance'] + folds['Test Profit'].sum()))
+
+
+# chart downsampling (user-021)
+
+@pytest.mark.parametrize('n,max_points', [(1000, 3), (1000, 50), (1001, 500), (5000, 999)])
+def test_lttb_keeps_endpoints_in_order(n, max_points):
+    rng = np.random.default_rng(n)
+    x = np.sort(rng.choice(10 * n, n, replace=False))
+    y = np.cumsum(rng.normal(size=n))
+    keep = tb.lttb(x, y, max_points)
+    assert len(keep) == max_points
+    assert keep[0] == 0 and keep[-1] == n - 1
+    assert (np.diff(keep) > 0).all()
+
+
+def test_lttb_keeps_an_isolated_spike():
+    y = np.zeros(1000)
+    y[637] = 50.0
+    assert 637 in tb.lttb(np.arange(1000), y, 20)
+
+
+@pytest.mark.parametrize('n', [0, 1, 5, 20])
+def test_lttb_short_series_keeps_every_point(n):
+    np.testing.assert_array_equal(tb.lttb(np.arange(n), np.ones(n), 20), np.arange(n))
+
+
+def test_lttb_fewer_than_three_points():
+    y = np.arange(100.0)
+    np.testing.assert_array_equal(tb.lttb(y, y, 2), [0, 99])
+    np.testing.assert_array_equal(tb.lttb(y, y, 1), [0])
+    assert len(tb.lttb(y, y, 0)) == 0
+
+
+@pytest.mark.parametrize('freq', ['5min', '1h', '4h', '1D', '7D'])
+def test_resample_ohlc_matches_pandas(freq):
+    # Three weeks of bars with overnight and weekend gaps
+    bars = make_bars(30_000, seed=12)
+    bars['datetime'] = pd.Timestamp('2021-01-04') + pd.to_timedelta(np.arange(len(bars)), 'min')
+    bars = bars[(bars['datetime'].dt.hour < 16) & (bars['datetime'].dt.dayofweek < 5)].reset_index(drop=True)
+    times = bars['datetime'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+    candles = tb.resample_ohlc(times, bars['open'], bars['high'], bars['low'], bars['close'], freq)
+    expected = bars.set_index('datetime').resample(freq, origin='epoch').agg(
+        {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last'}).dropna(how='all')
+    np.testing.assert_array_equal(candles['datetime'], expected.index.to_numpy(dtype='datetime64[ns]').view(np.int64))
+    for column in ('open', 'high', 'low', 'close'):
+        np.testing.assert_array_equal(candles[column], expected[column].to_numpy())
+
+
+def test_resample_ohlc_empty():
+    empty = np.zeros(0)
+    candles = tb.resample_ohlc(np.zeros(0, dtype=np.int64), empty, empty, empty, empty, '1h')
+    assert all(len(values) == 0 for values in candles.values())
+
+
+def test_candle_timeframe():
+    minutes = pd.Timestamp('2021-01-04').value + np.arange(3 * 1440) * pd.Timedelta('1min').value
+    assert tb.candle_timeframe(minutes, 5000) == '1min'
+    assert tb.candle_timeframe(minutes, 1000) == '5min'
+    assert tb.candle_timeframe(minutes, 100) == '1h'
+    assert tb.candle_timeframe(minutes, 5000, finest='15min') == '15min'
+    assert tb.candle_timeframe(minutes, 3) == '1D'
+    assert tb.candle_timeframe(minutes, 0) == '7D'  # coarsest, even if still too many
+    assert tb.candle_timeframe(minutes[:0], 10) == '1min'
+
+
+# cached loading (user-005)
+
+def symbol_bars(n, seed):
+    bars = make_bars(n, seed)
+    bars.insert(1, 'symbol', np.where(np.arange(n) < n // 2, 'NQH1', 'NQM1'))
+    return bars
+
+
+@pytest.mark.parametrize('order', ['sorted', 'shuffled', 'duplicates'])
+def test_load_minute_data_cache_matches_csv(tmp_path, monkeypatch, order):
+    bars = symbol_bars(5000, seed=13)
+    if order != 'sorted':
+        bars = bars.sample(frac=1, random_state=1)
+    if order == 'duplicates':
+        bars['datetime'] = bars['datetime'].dt.floor('5min')  # five rows per timestamp
+    path = write_csv(tmp_path / 'bars.csv', bars)
+
+    expected = tb.load_minute_data(path)
+    assert expected['datetime'].is_monotonic_increasing
+    assert expected['symbol'].dtype == object
+    pd.testing.assert_frame_equal(tb.load_minute_data(path, cache_dir=tmp_path / 'cache'), expected)
+
+    # Small chunks, so unsorted rows are spread over many of them
+    with tb.open_column_store(path, tmp_path / 'small', chunksize=700) as store:
+        pd.testing.assert_frame_equal(store.frame(), expected)
+
+    # The second load comes from the store, without parsing the CSV
+    monkeypatch.setattr(pd, 'read_csv', None)
+    pd.testing.assert_frame_equal(tb.load_minute_data(path, cache_dir=tmp_path / 'cache'), expected)
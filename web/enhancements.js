@@ -105,6 +105,16 @@
     if (txt) txt.textContent = message;
   }
 
+  // Map a progress event to a percentage: queued/loading at the start,
+  // simulation 10-90% by bars processed, metrics and reports after that
+  function progressPercent(p){
+    if (p.status === "completed" || p.status === "failed") return 100;
+    if (p.stage === "simulating" && p.total_bars) return 10 + 80 * p.bars / p.total_bars;
+    if (p.stage === "reporting") return 95;
+    if (p.stage === "loading") return 5;
+    return 2;
+  }
+
   // ------- Inline Progress (shown next to status text) -------
   let inlineBar;
   function injectInlineBar() {
@@ -165,105 +175,6 @@
     el.nextPage.disabled = page>=totalPages;
   }
 
-  // ------- Charts (placeholder rendering using Chart.js) -------
-  let equityChart, monthlyChart;
-  function drawCharts() {
-    if (!window.Chart) return;
-
-    // Dispose previous charts
-    equityChart && equityChart.destroy();
-    monthlyChart && monthlyChart.destroy();
-
-    // Equity curve (mock from parsedRows length)
-    const n = Math.min(200, Math.max(30, parsedRows.length || 100));
-    const eq = Array.from({length:n}, (_,i) => 100000 + Math.round((Math.sin(i/8)+Math.random()*0.5)*800) + i*10);
-    const labels = Array.from({length:n}, (_,i)=>i+1);
-
-    equityChart = new Chart(el.equityChart.getContext("2d"), {
-      type: "line",
-      data: { labels, datasets: [{ label:"Equity", data:eq, fill:false, tension:.25 }] },
-      options: {
-        responsive: true,
-        maintainAspectRatio: false,
-        interaction: { mode: "index", intersect: false },
-        plugins:{
-          legend:{ labels:{ color:"#cfe0ff" } },
-          zoom: {
-            zoom: { wheel: { enabled: true }, pinch: { enabled: true }, drag: { enabled: true }, mode: "xy" },
-            pan: { enabled: true, mode: "xy" }
-          }
-        },
-        scales:{
-          x:{ ticks:{ color:"#9fb3c7" }, grid:{ color:"rgba(255,255,255,.06)"} },
-          y:{ ticks:{ color:"#9fb3c7" }, grid:{ color:"rgba(255,255,255,.06)"} },
-        }
-      }
-    });
-    // Double-click equity chart to reset zoom
-    if (el.equityChart && equityChart?.resetZoom) {
-      el.equityChart.addEventListener("dblclick", () => equityChart.resetZoom());
-    }
-
-    // Monthly returns (dummy)
-    const months = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"];
-    const rets = months.map(()=> +( (Math.random()-0.4)*6 ).toFixed(2));
-    monthlyChart = new Chart(el.monthlyChart.getContext("2d"), {
-      type: "bar",
-      data: { labels: months, datasets: [{ label:"% Return", data: rets }] },
-      options: {
-        responsive: true,
-        maintainAspectRatio: false,
-        interaction: { mode: "index", intersect: false },
-        plugins:{
-          legend:{ labels:{ color:"#cfe0ff" } },
-          zoom: {
-            zoom: { wheel: { enabled: true }, pinch: { enabled: true }, mode: "xy" },
-            pan: { enabled: true, mode: "xy" }
-          }
-        },
-        scales:{
-          x:{ ticks:{ color:"#9fb3c7" }, grid:{ color:"rgba(255,255,255,.06)"} },
-          y:{ ticks:{ color:"#9fb3c7" }, grid:{ color:"rgba(255,255,255,.06)"}, beginAtZero:true }
-        }
-      }
-    });
-  }
-
-  // ------- Downloads (dummy enable after run) -------
-  function enableDownloads() {
-    el.dlTrades.disabled = false;
-    el.dlMetrics.disabled = false;
-
-    // Create minimal CSVs in-memory so buttons work
-    el.dlTrades.onclick = () => {
-      const csv = "entry_time,exit_time,side,qty,entry_price,exit_price,pnl\n" +
-        tradesCache.map(r => [r.entry_time,r.exit_time,r.side,r.qty,r.entry_price,r.exit_price,r.pnl].join(",")).join("\n");
-      const blob = new Blob([csv], {type:"text/csv"});
-      const a = document.createElement("a");
-      a.href = URL.createObjectURL(blob);
-      a.download = "trades.csv";
-      a.click();
-      URL.revokeObjectURL(a.href);
-    };
-
-    el.dlMetrics.onclick = () => {
-      const metrics = [
-        ["Starting Balance","100000"],
-        ["Ending Balance",(100000 + (tradesCache.reduce((s,r)=>s+Number(r.pnl),0))).toFixed(2)],
-        ["Win Rate (%)",(Math.random()*30+40).toFixed(2)],
-        ["Max Drawdown (%)",(Math.random()*12+6).toFixed(2)],
-        ["Profit Factor",(Math.random()*0.8+1.2).toFixed(2)]
-      ];
-      const csv = "metric,value\n" + metrics.map(m=>m.join(",")).join("\n");
-      const blob = new Blob([csv], {type:"text/csv"});
-      const a = document.createElement("a");
-      a.href = URL.createObjectURL(blob);
-      a.download = "metrics.csv";
-      a.click();
-      URL.revokeObjectURL(a.href);
-    };
-  }
-
   // ------- Wire Up Events -------
   function wire() {
     // File choose -> parse preview
@@ -308,40 +219,19 @@
 
       showLoader();
       el.status.textContent = "Running backtest…";
+    });
 
-      const steps = [
-        {progress: 10, message: "Loading CSV data..."},
-        {progress: 25, message: "Parsing timestamps and prices..."},
-        {progress: 40, message: "Running strategy logic..."},
-        {progress: 55, message: "Calculating position sizing..."},
-        {progress: 70, message: "Applying risk management..."},
-        {progress: 80, message: "Computing performance metrics..."},
-        {progress: 90, message: "Generating charts and reports..."},
-        {progress: 95, message: "Almost done, finalizing..."},
-        {progress: 100, message: "Complete!"}
-      ];
-
-      let i = 0;
-      const t = setInterval(() => {
-        if (i < steps.length) {
-          const s = steps[i++];
-          updateLoaderProgress(s.progress, s.message);
-        } else {
-          clearInterval(t);
-          setTimeout(() => {
-            hideLoader();
-            el.status.textContent = "Backtest completed successfully!";
-
-            // Reveal results tab & section
-            $$(".tab-btn").forEach(b => b.classList.toggle("active", b.dataset.tab === "results"));
-            toggleSection("results");
-
-            // Draw charts & enable downloads
-            drawCharts();
-            enableDownloads();
-          }, 500);
-        }
-      }, 300);
+    // Real progress from the backtest's SSE stream (see waitForBacktest in script.js)
+    document.addEventListener("backtest:progress", (e) => {
+      updateLoaderProgress(progressPercent(e.detail), progressText(e.detail));
+    });
+    document.addEventListener("backtest:done", (e) => {
+      hideLoader();
+      if (!e.detail.ok) return;
+      el.status.textContent = "Backtest completed successfully!";
+      // Reveal results tab & section; charts and downloads are rendered by script.js
+      $$(".tab-btn").forEach(b => b.classList.toggle("active", b.dataset.tab === "results"));
+      toggleSection("results");
     });
 
     // Trades controls
@@ -381,10 +271,6 @@
       const label = () => document.querySelector("#bt-progress-label");
       function start(text){
         stop(true); active = true; pct = 0; update(2, text || "Preparing...");
-        t = setInterval(()=>{
-          if (pct < 85) update(pct + Math.random()*3, "Crunching bars & ticks...");
-          else if (pct < 95) update(pct + Math.random()*1.2, "Almost there…");
-        }, 200);
       }
       function update(p, text){
         pct = Math.max(0, Math.min(100, p));
@@ -419,6 +305,12 @@
         if (runBtn) runBtn.disabled = true;
         if (el.status) el.status.textContent = "Running backtest…";
       }, true);
+      document.addEventListener("backtest:progress", (e)=>{
+        if (Progress.isActive()) Progress.update(progressPercent(e.detail), progressText(e.detail));
+      });
+      document.addEventListener("backtest:done", (e)=>{
+        if (!e.detail.ok) Progress.stop(true);
+      });
     })();
     function enableZoomOnCharts(){
       if (typeof Chart === "undefined" || !window["chartjs-plugin-zoom"]) { setTimeout(enableZoomOnCharts, 300); return; }
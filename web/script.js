@@ -6,7 +6,9 @@ const show = (id, v=true) => el(id).classList.toggle('hidden', !v);
 let lastBacktestId = null;
 let tradesCsvUrl = null;
 let metricsCsvUrl = null;
-let tradesData = []; // parsed trades rows for table
+let tradesData = []; // rows of the current trades page
+let tradesTotal = 0; // trades matching the filters, server-side
+let tradesQuery = {}; // filters passed to /backtests/{id}/trades
 let currentPage = 1;
 const pageSize = 20;
 
@@ -53,7 +55,7 @@ function renderPreviewTable(data){
 el('file').addEventListener('change', (e) => {
   const file = e.target.files[0];
   const info = el('file-info');
-  tradesData = []; currentPage = 1; // reset
+  tradesData = []; tradesTotal = 0; currentPage = 1; // reset
   if(!file){ info.textContent = ''; el('run').disabled = true; show('preview',false); return; }
   info.textContent = `${file.name} • ${formatBytes(file.size)}`;
   if(file.size > 220*1024*1024){
@@ -108,6 +110,7 @@ function renderMetrics(m){
     ['Average P&L', m.avg_pnl.toFixed(2)],
     ['Sharpe Ratio', m.sharpe_ratio.toFixed(2)],
     ['Max Drawdown', m.max_drawdown.toFixed(2)],
+    ['Daily Sortino', (m.daily_sortino_ratio || 0).toFixed(2)],
     ['Best Trade', m.best_trade.toFixed(2)],
     ['Worst Trade', m.worst_trade.toFixed(2)],
   ];
@@ -154,11 +157,58 @@ async function fetchBacktestDetail(id){
   return r.json();
 }
 
+// Backtests run in a background queue; follow the job's progress stream
+// (GET /backtests/{id}/progress, Server-Sent Events) until it finishes.
+// Each event is also dispatched on document as `backtest:progress`.
+function progressText(p){
+  if(p.status === 'queued') return 'Backtest queued...';
+  if(p.stage === 'simulating' && p.total_bars){
+    const pct = Math.floor(100 * p.bars / p.total_bars);
+    const eta = p.eta != null ? `, ETA ${Math.ceil(p.eta)}s` : '';
+    return `Simulating ${pct}% (${p.bars.toLocaleString()} / ${p.total_bars.toLocaleString()} bars, ${p.trades} trades${eta})`;
+  }
+  if(p.stage === 'loading') return 'Loading data...';
+  if(p.stage === 'reporting') return 'Computing metrics...';
+  return `Backtest ${p.status}...`;
+}
+
+function followBacktest(id){
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(`${API_BASE}/backtests/${id}/progress`);
+    source.onmessage = (e) => {
+      const p = JSON.parse(e.data);
+      document.dispatchEvent(new CustomEvent('backtest:progress', { detail: p }));
+      if(p.status === 'completed' || p.status === 'failed'){ source.close(); resolve(p); }
+      else el('status').textContent = progressText(p);
+    };
+    source.onerror = () => { source.close(); reject(new Error('progress stream closed')); };
+  });
+}
+
+async function waitForBacktest(id, intervalMs=1000){
+  if(window.EventSource){
+    try{
+      const p = await followBacktest(id);
+      if(p.status === 'failed') throw new Error(p.error || 'Backtest failed');
+      return await fetchBacktestDetail(id);
+    }catch(err){
+      if(err.message !== 'progress stream closed') throw err;
+    }
+  }
+  // Fallback: poll the detail endpoint
+  for(;;){
+    const detail = await fetchBacktestDetail(id);
+    if(!detail.status || detail.status === 'completed') return detail;
+    if(detail.status === 'failed') throw new Error(detail.error || 'Backtest failed');
+    el('status').textContent = progressText(detail);
+    await new Promise(resolve => setTimeout(resolve, intervalMs));
+  }
+}
+
 function renderTradesTablePage(){
   const table = el('trades-table');
   table.innerHTML='';
-  const start = (currentPage-1)*pageSize;
-  const pageRows = tradesData.slice(start, start+pageSize);
+  const pageRows = tradesData;
   if(!pageRows.length){ table.innerHTML = '<tr><td>No trades loaded</td></tr>'; return; }
   const headers = Object.keys(pageRows[0]);
   const thead = document.createElement('thead');
@@ -180,29 +230,34 @@ function renderTradesTablePage(){
     tbody.appendChild(tr);
   });
   table.appendChild(thead); table.appendChild(tbody);
-  el('page-info').textContent = `Page ${currentPage} / ${Math.max(1, Math.ceil(tradesData.length/pageSize))}`;
+  el('page-info').textContent = `Page ${currentPage} / ${Math.max(1, Math.ceil(tradesTotal/pageSize))}`;
 }
 
-async function loadTradesCsvToTable(filterSide='both', filterPnl='all'){
-  if(!tradesCsvUrl) return;
-  const res = await fetch(tradesCsvUrl);
-  const text = await res.text();
-  const parsed = Papa.parse(text, { header: true });
-  let rows = parsed.data.filter(r=>Object.keys(r).length>1);
-  // Optional filtering
-  if(filterSide !== 'both') rows = rows.filter(r => (r['Position']||'').toLowerCase() === filterSide);
-  if(filterPnl === 'wins') rows = rows.filter(r => parseFloat(r['P&L']||r['PNL']||0) > 0);
-  if(filterPnl === 'losses') rows = rows.filter(r => parseFloat(r['P&L']||r['PNL']||0) < 0);
-  tradesData = rows;
-  currentPage = 1;
+// Trades are paged, filtered and sorted by the API (GET /backtests/{id}/trades)
+async function loadTradesPage(){
+  if(!lastBacktestId) return;
+  const q = new URLSearchParams({ page: currentPage, page_size: pageSize, ...tradesQuery });
+  const res = await fetch(`${API_BASE}/backtests/${lastBacktestId}/trades?${q}`);
+  if(!res.ok) throw new Error('Failed to fetch trades');
+  const data = await res.json();
+  tradesData = data.trades || [];
+  tradesTotal = data.total || 0;
   renderTradesTablePage();
 }
 
-el('prev-page').onclick = ()=>{ if(currentPage>1){ currentPage--; renderTradesTablePage(); }};
-el('next-page').onclick = ()=>{ const maxp = Math.max(1, Math.ceil(tradesData.length/pageSize)); if(currentPage<maxp){ currentPage++; renderTradesTablePage(); }};
+async function loadTradesTable(filterSide='both', filterPnl='all'){
+  tradesQuery = {};
+  if(filterSide !== 'both') tradesQuery.position = filterSide;
+  if(filterPnl === 'wins' || filterPnl === 'losses') tradesQuery.result = filterPnl;
+  currentPage = 1;
+  await loadTradesPage();
+}
+
+el('prev-page').onclick = ()=>{ if(currentPage>1){ currentPage--; loadTradesPage(); }};
+el('next-page').onclick = ()=>{ const maxp = Math.max(1, Math.ceil(tradesTotal/pageSize)); if(currentPage<maxp){ currentPage++; loadTradesPage(); }};
 el('load-trades').onclick = ()=>{
   const side = el('side-filter').value; const pf = el('pnl-filter').value;
-  loadTradesCsvToTable(side, pf);
+  loadTradesTable(side, pf);
 };
 
 el('upload-form').addEventListener('submit', async (e)=>{
@@ -221,13 +276,9 @@ el('upload-form').addEventListener('submit', async (e)=>{
     if(!r.ok){ throw new Error(await r.text()); }
     const { id } = await r.json();
     lastBacktestId = id;
-    el('status').textContent = 'Backtest completed. Loading results...';
+    el('status').textContent = 'Backtest queued...';
 
-    const detail = await fetchBacktestDetail(id);
-    if(detail.status && detail.status !== 'completed'){
-      el('status').textContent = `Status: ${detail.status}`;
-      return;
-    }
+    const detail = await waitForBacktest(id);
 
     // Render metrics & charts
     renderMetrics(detail.metrics);
@@ -242,9 +293,11 @@ el('upload-form').addEventListener('submit', async (e)=>{
     // Show results section
     show('results', true);
     el('status').textContent = 'Done';
+    document.dispatchEvent(new CustomEvent('backtest:done', { detail: { ok: true } }));
   }catch(err){
     console.error(err);
     el('status').textContent = 'Error: '+ err;
+    document.dispatchEvent(new CustomEvent('backtest:done', { detail: { ok: false, error: String(err) } }));
   }finally{
     el('run').disabled = false;
   }